@@ -0,0 +1,118 @@
+"""Runtime speedup and nibble time of every workload for each pass.
+
+Each pass is applied on its own (together with the passes a workload
+requires) and as part of the default configuration.
+
+    python -m benchmarks [--number N] [--repeat R] [workload ...]
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from timeit import repeat
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from nibbler import Nibbler
+from nibbler.config import DEFAULT_CONFIG
+from nibbler.extension import cache_attributes
+from nibbler.extension import constantize_globals
+from nibbler.extension import eliminate_dead_code
+from nibbler.extension import fold_constants
+from nibbler.extension import global_to_fast
+from nibbler.extension import hoist_invariants
+from nibbler.extension import inline
+from nibbler.extension import peephole
+from nibbler.extension import precompute_conditionals
+from nibbler.extension import unroll_loops
+
+from . import workloads
+from .workloads import Workload
+from .workloads import WORKLOADS
+
+CONFIGS = [
+    (extension.__name__.rsplit(".", 1)[-1], [extension.EXTENSION])
+    for extension in (
+        inline,
+        cache_attributes,
+        constantize_globals,
+        unroll_loops,
+        fold_constants,
+        precompute_conditionals,
+        global_to_fast,
+        eliminate_dead_code,
+        hoist_invariants,
+        peephole,
+    )
+] + [("default", DEFAULT_CONFIG)]
+
+
+def nibble(workload: Workload, config: List[Callable]) -> Tuple[Callable, float]:
+    # Opt-in optimizations only apply to configurations that contain the
+    # passes making use of them
+    nibbler = Nibbler(
+        vars(workloads),
+        config=config,
+        cache_attributes=["buffer.append"],
+        unroll_loops=True,
+        specialize_types=True,
+    )
+    for inline_function in workload.inline_functions:
+        nibbler.inline(inline_function)
+
+    start = perf_counter()
+    nibbled = (
+        nibbler.specialize_on(*workload.specialize_on)(workload.target)
+        if workload.specialize_on
+        else nibbler.nibble(workload.target)
+    )
+    return nibbled, perf_counter() - start
+
+
+def runtime(callable_: Callable, args: Tuple, number: int, repeat_: int) -> float:
+    return min(repeat(lambda: callable_(*args), number=number, repeat=repeat_)) / number
+
+
+def main() -> None:
+    parser = ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("workloads", nargs="*", metavar="workload")
+    arguments = parser.parse_args()
+
+    print(
+        f"{'workload':<16} {'passes':<24} {'runtime':>12} {'speedup':>8}"
+        f" {'nibble time':>12}"
+    )
+
+    for workload in WORKLOADS:
+        if arguments.workloads and workload.name not in arguments.workloads:
+            continue
+
+        expected = workload.plain(*workload.args)
+        plain_runtime = runtime(
+            workload.plain, workload.args, arguments.number, arguments.repeat
+        )
+        print(f"{workload.name:<16} {'plain':<24} {plain_runtime * 1e6:>10.1f}us")
+
+        for name, config in CONFIGS:
+            config = workload.required + [
+                extension for extension in config if extension not in workload.required
+            ]
+
+            nibbled, nibble_time = min(
+                (nibble(workload, config) for _ in range(arguments.repeat)),
+                key=lambda result: result[1],
+            )
+            assert nibbled(*workload.args) == expected
+
+            nibbled_runtime = runtime(
+                nibbled, workload.args, arguments.number, arguments.repeat
+            )
+            print(
+                f"{'':<16} {name:<24} {nibbled_runtime * 1e6:>10.1f}us"
+                f" {plain_runtime / nibbled_runtime:>7.2f}x {nibble_time * 1e3:>10.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Workloads comparing plain functions to their nibbled counterparts.
+
+Every workload provides an idiomatic (plain) implementation and a target
+that's nibbled with different pass configurations. Targets that rely on
+inlining can't run without the passes they require.
+"""
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from nibbler import Constant
+from nibbler.extension import constantize_globals
+from nibbler.extension import global_to_fast
+from nibbler.extension import inline
+
+__all__ = ["Workload", "WORKLOADS"]
+
+DEBUG: Constant[bool] = False
+SCALE: Constant[int] = 3
+OFFSET: Constant[int] = 7
+FIELDS: Constant[tuple] = ("id", "name", "email", "age")
+
+LARGE_FUNCTION_STATEMENTS = 400
+
+
+@dataclass
+class Workload:
+    name: str
+    plain: Callable
+    target: Callable
+    args: Tuple
+    inline_functions: List[Callable] = field(default_factory=list)
+    # Passes the target can't run without
+    required: List[Callable] = field(default_factory=list)
+    # Arguments the target is specialized on (specialize_on)
+    specialize_on: Tuple[str, ...] = ()
+
+
+# Tight loop with an inlined helper
+def square(number: int, base: int) -> int:
+    return number ** base
+
+
+def sequential_square_plain(numbers: Iterable[int]) -> int:
+    product = 0
+    for number in numbers:
+        product += square(number, 2)
+    return product
+
+
+def square_inline(number: int, base: int) -> int:
+    result = number ** base  # noqa: F841
+
+
+def sequential_square(numbers: Iterable[int]) -> int:
+    product = 0
+    base = 2  # noqa: F841
+    for number in numbers:
+        square_inline()
+        product += result  # noqa: F821
+    return product
+
+
+# Builtin heavy loop
+def builtins_loop(values: List[int]) -> int:
+    total = 0
+    for value in values:
+        total += abs(value) + len(str(value)) + min(value, OFFSET) + max(value, 0)
+    return total
+
+
+# Loop guarded by a constant
+def debug_loop(values: List[int]) -> int:
+    total = 0
+    for value in values:
+        if DEBUG:
+            print(f"value: {value}")
+        total += value * SCALE
+        if DEBUG:
+            print(f"total: {total}")
+    return total
+
+
+# Loop with invariant method lookups and arithmetic
+def invariant_loop(values: List[int]) -> List[int]:
+    result = []
+    scale = SCALE
+    offset = OFFSET
+    for value in values:
+        result.append(value * (scale + offset))
+    return result
+
+
+# Loop over parameters annotated with builtin types
+def typed_loop(values: List[int], scale: int, offset: int) -> List[int]:
+    result = []
+    for value in values:
+        result.append(value * (scale + offset))
+    return result
+
+
+# Loop over a fixed schema
+def serialize(record: Dict[str, int]) -> str:
+    parts = []
+    for name in FIELDS:
+        parts.append(f"{name}={record[name]}")
+    return ",".join(parts)
+
+
+# Loop branching on an argument that is the same for most calls
+def render(values: Iterable[int], fmt: str) -> List[str]:
+    parts = []
+    for value in values:
+        if fmt == "json":
+            parts.append(f'"{value}"')
+        elif fmt == "xml":
+            parts.append(f"<value>{value}</value>")
+        else:
+            parts.append(str(value))
+    return parts
+
+
+# Loop appending to a list held by an attribute (cache_attributes)
+class Tokens:
+    def __init__(self) -> None:
+        self.buffer: List[int] = []
+
+
+def collect(tokens: Tokens, numbers: Iterable[int]) -> int:
+    tokens.buffer.clear()
+    for number in numbers:
+        if number % 2:
+            tokens.buffer.append(number)
+    return len(tokens.buffer)
+
+
+# Large function (mostly relevant for nibble time)
+exec(
+    "def large_function(value):\n"
+    + "".join(
+        f"    value = abs(value * SCALE + OFFSET - {index}) % 1000\n"
+        f"    if DEBUG:\n"
+        f"        print(value)\n"
+        for index in range(LARGE_FUNCTION_STATEMENTS)
+    )
+    + "    return value\n"
+)
+
+NUMBERS = tuple(range(-500, 500))
+
+WORKLOADS = [
+    Workload(
+        "inline",
+        sequential_square_plain,
+        sequential_square,
+        (NUMBERS,),
+        inline_functions=[square_inline],
+        required=[inline.EXTENSION, global_to_fast.EXTENSION],
+    ),
+    Workload("builtins", builtins_loop, builtins_loop, (NUMBERS,)),
+    Workload("debug", debug_loop, debug_loop, (NUMBERS,)),
+    Workload("invariants", invariant_loop, invariant_loop, (NUMBERS,)),
+    Workload("typed", typed_loop, typed_loop, (list(NUMBERS), SCALE, OFFSET)),
+    Workload(
+        "unroll",
+        serialize,
+        serialize,
+        (dict(zip(FIELDS, range(len(FIELDS)))),),
+        required=[constantize_globals.EXTENSION],
+    ),
+    Workload("specialize_on", render, render, (NUMBERS, "csv"), specialize_on=("fmt",)),
+    Workload("attributes", collect, collect, (Tokens(), NUMBERS)),
+    Workload(
+        "large_function",
+        large_function,  # noqa: F821
+        large_function,  # noqa: F821
+        (42,),
+    ),
+]
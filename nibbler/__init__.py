@@ -1,31 +1,77 @@
 from __future__ import annotations
 
-import builtins
+from collections import ChainMap
 from copy import deepcopy
+from dataclasses import asdict
+from dataclasses import replace
 from enum import Enum
+from functools import partial
+from json import dump
 from sys import modules
 from types import FunctionType
 from typing import _eval_type
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import get_type_hints
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import TextIO
+from typing import Tuple
+from typing import Union
 
 from .annotations import Constant
+from .annotations import exact_type
+from .annotations import is_marked
+from .annotations import Stable
+from .cache import cached
+from .cache import cached_all
 from .config import DEFAULT_CONFIG
 from .constants import CODE_TYPE
 from .containers import Context
+from .extension.constantize_globals import EXTENSION as constantize_globals
+from .guard import Guard
+from .guard import guarded_names
+from .instrumentation import FunctionReport
+from .lazy import Trampoline
+from .namespace import BuiltinFunctions
+from .namespace import clone_function
+from .namespace import module_classes
+from .namespace import module_functions
+from .namespace import registered_name
+from .parallel import optimize_all
+from .pipeline import optimize
+from .pipeline import unsupported
+from .profiling import dump_profile
+from .profiling import estimated_savings
+from .profiling import FunctionProfile
+from .profiling import HotFunction
+from .profiling import hottest
+from .profiling import load_profile
+from .profiling import Profiler
+from .specialize import Dispatcher
+from .util import assigned_names
 
-CONSTANT_TYPE = type(Constant)
 MODULE_TYPE = type(modules[list(modules.keys())[0]])
+# All attributes of self that are read repeatedly or the attribute chains
+# (buf, buf.append) that are named
+CACHE_ATTRIBUTES = Union[bool, Iterable[str]]
 
+# Functions nibble_hot() nibbles by default
+HOT_FUNCTIONS = 10
+# Clones specialize_on() keeps per function by default
+MAX_SPECIALIZED_CLONES = 32
 
-__all__ = ["Constant", "Nibbler"]
+
+__all__ = ["Constant", "Nibbler", "Stable"]
 
 
 class FunctionKind(Enum):
     CONSTANT = 1
     INLINE = 2
+    PURE = 3
 
 
 class Nibbler:
@@ -35,6 +81,13 @@ class Nibbler:
         deep_copy: bool = True,
         config: List[Callable[CODE_TYPE, Context]] = DEFAULT_CONFIG,
         debug: bool = False,
+        cache: bool = False,
+        lazy: bool = False,
+        instrument: bool = False,
+        guarded: bool = False,
+        cache_attributes: CACHE_ATTRIBUTES = False,
+        unroll_loops: bool = False,
+        specialize_types: bool = False,
     ):
         if "__name__" not in module_namespace:
             # To-Do: Subclass ValueError
@@ -43,6 +96,17 @@ class Nibbler:
         self._module_namespace: Dict[str, Any] = module_namespace
         self._config: List[Callable[CODE_TYPE, Context]] = config
         self._debug: bool = debug
+        self._cache: bool = cache
+        self._lazy: bool = lazy
+        self._instrument: bool = instrument
+        self._guarded: bool = guarded
+        self._cache_attributes: CACHE_ATTRIBUTES = cache_attributes
+        self._unroll_loops: bool = unroll_loops
+        self._specialize_types: bool = specialize_types
+        self._deep_copy: bool = deep_copy
+        self._report: List[FunctionReport] = []
+        self._profiler: Optional[Profiler] = None
+        self._hot_functions: List[HotFunction] = []
 
         self._module_name: str = module_namespace["__name__"]
         self._module: MODULE_TYPE = modules[self._module_name]
@@ -55,46 +119,104 @@ class Nibbler:
             ).items()
         }
 
-        self._constant_variables: Dict[str, Any] = {
-            name: deepcopy(value) if deep_copy else value
+        # Objects constant variables were copied from (guards compare to them)
+        self._constant_sources: Dict[str, Any] = {
+            name: value
             for name, value in module_namespace.items()
             if name in self._evaluated_annotations
-            # Marked Constant or Constant[SubType]
-            and (
-                type(self._evaluated_annotations[name]) is CONSTANT_TYPE
-                or (
-                    hasattr(self._evaluated_annotations[name], "__origin__")
-                    and type(self._evaluated_annotations[name].__origin__)
-                    is CONSTANT_TYPE
-                )
-            )
+            and is_marked(self._evaluated_annotations[name], Constant)
         }
-        # Mark builtins as constant functions
-        self._constant_functions: Dict[str, Callable] = {
-            name: func
-            for name, func in (
-                (name, getattr(builtins, name))
-                for name in dir(builtins)
-                if not name.startswith("_") and name[0].lower() == name[0]
-            )
-            if callable(func)
+        self._constant_variables: Dict[str, Any] = {
+            name: self._snapshot(value)
+            for name, value in self._constant_sources.items()
         }
+        # Functions registered with @nibbler.constant (builtins are constant
+        # as well, see context)
+        self._constant_functions: Dict[str, Callable] = {}
         self._inline_functions: Dict[str, Callable] = {}
+        self._pure_functions: Dict[str, Callable] = {}
+        # Attributes of classes that are decorated while they are defined
+        self._stable_attributes: Set[str] = set()
+        # Classes whose annotations were examined (once per class)
+        self._examined_classes: Set[type] = set()
 
         self._function_mapping: Dict[FunctionKind, Dict[str, Callable]] = {
             FunctionKind.CONSTANT: self._constant_functions,
             FunctionKind.INLINE: self._inline_functions,
+            FunctionKind.PURE: self._pure_functions,
         }
 
+    def _snapshot(self, value: Any) -> Any:
+        # Modules can't be copied (their attributes are resolved on the
+        # module itself)
+        return (
+            deepcopy(value)
+            if self._deep_copy and not isinstance(value, MODULE_TYPE)
+            else value
+        )
+
     @property
     def context(self) -> Context:
         return Context(
             self._module_namespace,
-            {**self._constant_variables, **self._constant_functions},
+            ChainMap(
+                # Pure functions are constant as well
+                self._pure_functions,
+                {
+                    name: func
+                    for name, func in self._constant_functions.items()
+                    if self._module_namespace.get(name, func) is func
+                },
+                self._constant_variables,
+                # Module level definitions shadow builtins
+                BuiltinFunctions(self._module_namespace),
+            ),
             self._inline_functions,
             self._debug,
+            self._pure_functions,
+            stable_attributes=self._collect_stable_attributes(),
+            unroll_loops=self._unroll_loops,
         )
 
+    def _collect_stable_attributes(self) -> Set[str]:
+        # Classes of the module (and the classes nested within them) that
+        # weren't examined yet
+        for value in list(self._module_namespace.values()):
+            if not isinstance(value, type) or value in self._examined_classes:
+                continue
+            for cls in module_classes({value.__name__: value}, self._module_name):
+                self._examine_class(cls)
+            self._examined_classes.add(value)
+
+        return set(self._stable_attributes)
+
+    def _examine_class(self, cls: type) -> None:
+        if cls not in self._examined_classes:
+            self._examined_classes.add(cls)
+            self._stable_attributes |= self._class_stable_attributes(cls)
+
+    def _class_stable_attributes(self, cls: type) -> Set[str]:
+        # Attributes annotated Stable or Stable[SubType] in the class body,
+        # only string annotations (from __future__ import annotations) that
+        # mention Stable are evaluated. Annotations that can't be evaluated
+        # (forward references to names imported for type checking) aren't
+        # markers.
+        attributes = set()
+        for name, annotation in vars(cls).get("__annotations__", {}).items():
+            if isinstance(annotation, str):
+                if "Stable" not in annotation:
+                    continue
+                try:
+                    annotation = eval(
+                        annotation, self._module_namespace, dict(vars(cls))
+                    )
+                except Exception:
+                    continue
+            if is_marked(annotation, Stable):
+                attributes.add(name)
+
+        return attributes
+
     def _ensure_matching_module(self, callable_: Callable):
         if callable_.__module__ != self._module_name:
             raise ValueError(
@@ -119,7 +241,7 @@ class Nibbler:
                 # To-Do: Subclass ValueError
                 raise ValueError(f"function already marked as '{function_type.name}'")
 
-        function_type_dict[callable_.__name__] = callable_
+        function_type_dict[registered_name(callable_)] = callable_
 
         return callable_
 
@@ -129,14 +251,413 @@ class Nibbler:
     def inline(self, callable_: Callable) -> Callable:
         return self._decorator(callable_, FunctionKind.INLINE)
 
-    def nibble(self, callable_: Callable) -> Callable:
-        self._ensure_matching_module(callable_)
+    def pure(self, callable_: Callable) -> Callable:
+        return self._decorator(callable_, FunctionKind.PURE)
 
-        context = self.context
+    def override_constants(self, values: Dict[str, Any]) -> None:
+        # Values constants are nibbled with instead of the ones in the module
+        # namespace (e.g. DEBUG at build time)
+        for name, value in values.items():
+            if name not in self._constant_variables:
+                # To-Do: Subclass ValueError
+                raise ValueError(f"'{self._module_name}.{name}' is not marked constant")
+            self._constant_sources[name] = value
+            self._constant_variables[name] = value
+
+    @property
+    def report(self) -> List[Dict[str, Any]]:
+        return [asdict(function_report) for function_report in self._report]
+
+    def dump_report(self, file: TextIO) -> None:
+        dump(self.report, file, indent=2)
+
+    @property
+    def profile(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: asdict(function)
+            for name, function in (
+                self._profiler.profile if self._profiler is not None else {}
+            ).items()
+        }
+
+    def dump_profile(self, file: TextIO) -> None:
+        dump_profile(self._profiler.profile if self._profiler is not None else {}, file)
+
+    @property
+    def hot_report(self) -> List[Dict[str, Any]]:
+        return [asdict(hot_function) for hot_function in self._hot_functions]
+
+    def _optimize(
+        self, code: CODE_TYPE, context: Context, nested: bool = False
+    ) -> CODE_TYPE:
+        report = None
+        if self._instrument:
+            # Methods of different classes share their names
+            report = FunctionReport(
+                f"{self._module_name}.{context.qualname or code.co_name}"
+            )
+            self._report.append(report)
+
+        return optimize(code, context, self._config, report, nested)
+
+    def _optimize_all(
+        self,
+        callables: List[Callable],
+        contexts: List[Context],
+        processes: Optional[int],
+    ) -> List[CODE_TYPE]:
+        # Reports can't be collected from other processes
+        if processes is None or self._instrument:
+            return [
+                self._optimize(callable_.__code__, context, nested=True)
+                for callable_, context in zip(callables, contexts)
+            ]
+
+        return optimize_all(
+            [callable_.__code__ for callable_ in callables],
+            contexts,
+            self._config,
+            processes,
+        )
+
+    def _parameter_types(self, callable_: Callable) -> Dict[str, type]:
+        # Parameters annotated with builtin types (cells are initialized from
+        # parameters before the type guards could check them)
+        try:
+            hints = get_type_hints(callable_)
+        except Exception:
+            return {}
 
         code = callable_.__code__
+        return {
+            name: exact_type(hints[name])
+            for name in code.co_varnames[: code.co_argcount + code.co_kwonlyargcount]
+            if name in hints
+            and exact_type(hints[name]) is not None
+            and name not in code.co_cellvars
+        }
+
+    def _function_context(
+        self,
+        context: Context,
+        callable_: Callable,
+        cache_attributes: Optional[CACHE_ATTRIBUTES] = None,
+    ) -> Context:
+        if cache_attributes is None:
+            cache_attributes = self._cache_attributes
+        # Shallow copy, the merged constants are shared
+        return replace(
+            context,
+            qualname=callable_.__qualname__,
+            cache_attributes=cache_attributes is True,
+            cached_attributes=set()
+            if isinstance(cache_attributes, bool)
+            else {cache_attributes}
+            if isinstance(cache_attributes, str)
+            else set(cache_attributes),
+            parameter_types=self._parameter_types(callable_)
+            if self._specialize_types
+            else {},
+        )
 
-        for extension in self._config:
-            code = extension(code, context)
+    def nibble_code(
+        self,
+        callable_: Callable,
+        context: Optional[Context] = None,
+        cache_attributes: Optional[CACHE_ATTRIBUTES] = None,
+    ) -> CODE_TYPE:
+        # Optimized code of the function (which is left alone), contexts
+        # can be shared by several calls
+        context = self._function_context(
+            context if context is not None else self.context,
+            callable_,
+            cache_attributes,
+        )
+        # Nested functions, lambdas, comprehensions, ... are optimized as well
+        optimize = partial(self._optimize, nested=True)
+
+        return (
+            cached(self._module, callable_, context, self._config, optimize)
+            if self._cache
+            else optimize(callable_.__code__, context)
+        )
+
+    def _nibble_codes(
+        self, callables: List[Callable], processes: Optional[int]
+    ) -> List[CODE_TYPE]:
+        # The whole batch shares one context
+        context = self.context
+        contexts = [
+            self._function_context(context, callable_) for callable_ in callables
+        ]
+        optimize = partial(self._optimize_all, processes=processes)
+
+        return (
+            cached_all(self._module, callables, contexts, self._config, optimize)
+            if self._cache
+            else optimize(callables, contexts)
+        )
+
+    def _refresh_constants(self, names: Set[str]) -> None:
+        for name in names & self._constant_variables.keys():
+            if name not in self._module_namespace:
+                del self._constant_sources[name], self._constant_variables[name]
+            elif self._module_namespace[name] is not self._constant_sources[name]:
+                value = self._module_namespace[name]
+                self._constant_sources[name] = value
+                self._constant_variables[name] = self._snapshot(value)
+
+    def _specialize(
+        self, callable_: Callable, cache_attributes: Optional[CACHE_ATTRIBUTES] = None
+    ) -> Tuple[CODE_TYPE, Dict[str, Any]]:
+        # Constants that changed since they were last snapshotted are updated
+        self._refresh_constants(guarded_names(callable_.__code__, self.context))
+
+        context = self.context
+        specialized = self.nibble_code(
+            callable_, context, cache_attributes=cache_attributes
+        )
+        # Only globals whose loads were actually replaced are guarded
+        guards = {
+            name: self._constant_sources[name]
+            if name in self._constant_variables
+            else context.inline_functions[name]
+            if name in context.inline_functions
+            else context.constants[name]
+            for name in guarded_names(callable_.__code__, context, specialized)
+        }
+
+        return specialized, guards
+
+    def _nibble_attribute(
+        self,
+        value: Any,
+        lazy: Optional[bool],
+        cache_attributes: Optional[CACHE_ATTRIBUTES],
+    ) -> Any:
+        nibble = partial(
+            self._nibble_attribute, lazy=lazy, cache_attributes=cache_attributes
+        )
+
+        # Wrappers (defined in other modules) are left alone
+        if isinstance(value, FunctionType):
+            return (
+                self.nibble(value, lazy=lazy, cache_attributes=cache_attributes)
+                if value.__globals__ is self._module_namespace
+                else value
+            )
+        # Static methods have no self to cache attributes of
+        if type(value) is staticmethod:
+            return staticmethod(
+                self._nibble_attribute(value.__func__, lazy, cache_attributes=False)
+            )
+        if type(value) is classmethod:
+            return classmethod(nibble(value.__func__))
+        if type(value) is property:
+            return property(
+                *(
+                    nibble(function) if function is not None else None
+                    for function in (value.fget, value.fset, value.fdel)
+                ),
+                value.__doc__,
+            )
+
+        return value
+
+    def _nibble_class(
+        self,
+        cls: type,
+        lazy: Optional[bool],
+        cache_attributes: Optional[CACHE_ATTRIBUTES],
+    ) -> type:
+        self._ensure_matching_module(cls)
+        # The class isn't part of the module namespace yet
+        self._stable_attributes |= self._class_stable_attributes(cls)
+
+        for name, value in list(vars(cls).items()):
+            # Nested classes (but not aliases of other classes)
+            if isinstance(value, type):
+                if value.__qualname__ == f"{cls.__qualname__}.{name}":
+                    self._nibble_class(value, lazy, cache_attributes)
+                continue
+
+            nibbled = self._nibble_attribute(value, lazy, cache_attributes)
+            if nibbled is not value:
+                setattr(cls, name, nibbled)
+
+        return cls
+
+    def nibble(
+        self,
+        callable_: Optional[Callable] = None,
+        *,
+        lazy: Optional[bool] = None,
+        cache_attributes: Optional[CACHE_ATTRIBUTES] = None,
+    ) -> Callable:
+        # Used as @nibbler.nibble(lazy=..., cache_attributes=...)
+        if callable_ is None:
+            return partial(self.nibble, lazy=lazy, cache_attributes=cache_attributes)
+
+        # Every method (including properties, class and static methods)
+        if isinstance(callable_, type):
+            return self._nibble_class(callable_, lazy, cache_attributes)
+
+        self._ensure_matching_module(callable_)
+        # Guards and trampolines are made of bytecode as well
+        if unsupported():
+            return callable_
+
+        # Specialized code is guarded against changes to the globals it
+        # depends on
+        guard = (
+            Guard(
+                callable_.__code__,
+                partial(self._specialize, callable_, cache_attributes),
+            )
+            if self._guarded
+            else None
+        )
+        optimize = (
+            guard.code
+            if guard
+            else partial(self.nibble_code, callable_, cache_attributes=cache_attributes)
+        )
+
+        # Defer optimization to the first call
+        if lazy if lazy is not None else self._lazy:
+            function = Trampoline(callable_, optimize).function
+        else:
+            function = clone_function(callable_, optimize())
+
+        if guard:
+            guard.function = function
+
+        return function
+
+    def specialize_on(
+        self, *names: str, maxsize: int = MAX_SPECIALIZED_CLONES
+    ) -> Callable[[Callable], Callable]:
+        # Calls are dispatched to clones nibbled for the values of the named
+        # arguments (which are constant within each clone), once there are
+        # maxsize clones the oldest one is evicted (first in, first out)
+        def decorator(callable_: Callable) -> Callable:
+            self._ensure_matching_module(callable_)
+            code = callable_.__code__
+            keyword_only = code.co_varnames[
+                code.co_argcount : code.co_argcount + code.co_kwonlyargcount
+            ]
+            for name in names:
+                if (
+                    name not in code.co_varnames[: code.co_argcount]
+                    and name not in keyword_only
+                ):
+                    # To-Do: Subclass ValueError
+                    raise ValueError(
+                        f"'{name}' is not a parameter of '{callable_.__qualname__}'"
+                    )
+
+            # Arguments the function assigns (or that nested functions share)
+            # can't become constants, dispatching on them doesn't pay off
+            assigned = assigned_names(code)
+            specialized = [
+                name
+                for name in names
+                if name not in assigned and name not in code.co_cellvars
+            ]
+            if not specialized or constantize_globals not in self._config:
+                return self.nibble(callable_)
+
+            def create(arguments: Dict[str, Any]) -> Callable:
+                context = replace(self.context, arguments=arguments)
+                return clone_function(callable_, self.nibble_code(callable_, context))
+
+            return Dispatcher(callable_, specialized, create, maxsize).function
+
+        return decorator
+
+    def nibble_all(
+        self, callables: Iterable[Callable], processes: Optional[int] = None
+    ) -> List[Callable]:
+        callables = list(callables)
+        for callable_ in callables:
+            self._ensure_matching_module(callable_)
+
+        return [
+            clone_function(callable_, code)
+            for callable_, code in zip(
+                callables, self._nibble_codes(callables, processes)
+            )
+        ]
+
+    def nibble_module(self, processes: Optional[int] = None) -> None:
+        # Functions and methods are optimized in place
+        functions = list(module_functions(self._module_namespace, self._module_name))
+
+        for function, code in zip(functions, self._nibble_codes(functions, processes)):
+            function.__code__ = code
+
+    def start_profiling(
+        self, threshold: Optional[int] = None, count: int = HOT_FUNCTIONS
+    ) -> None:
+        # Calls of functions and methods of the module (on the current thread)
+        # are counted and timed until profiling is stopped. After threshold
+        # calls profiling stops and the count hottest functions are nibbled.
+        if self._profiler is not None:
+            self._profiler.stop()
+
+        self._profiler = Profiler(
+            {
+                function.__code__: function.__qualname__
+                for function in module_functions(
+                    self._module_namespace, self._module_name
+                )
+            },
+            threshold,
+            partial(self.nibble_hot, count) if threshold is not None else None,
+        )
+        self._profiler.start()
+
+    def stop_profiling(self) -> None:
+        if self._profiler is not None:
+            self._profiler.stop()
+
+    def nibble_hot(
+        self,
+        count: int = HOT_FUNCTIONS,
+        profile: Optional[TextIO] = None,
+        processes: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        # The count functions the most time was spent in (according to the
+        # current profile or one dumped by an earlier run) are optimized in
+        # place
+        functions = {
+            function.__qualname__: function
+            for function in module_functions(self._module_namespace, self._module_name)
+        }
+        function_profiles: Dict[str, FunctionProfile] = {
+            name: function
+            for name, function in (
+                load_profile(profile)
+                if profile is not None
+                else self._profiler.profile
+                if self._profiler is not None
+                else {}
+            ).items()
+            if name in functions
+        }
+
+        names = hottest(function_profiles, count)
+        callables = [functions[name] for name in names]
+        hot_functions = []
+        for name, function, code in zip(
+            names, callables, self._nibble_codes(callables, processes)
+        ):
+            hot_functions.append(
+                estimated_savings(
+                    name, function_profiles[name], function.__code__, code
+                )
+            )
+            function.__code__ = code
+        self._hot_functions += hot_functions
 
-        return FunctionType(code, callable_.__globals__, code.co_name)
+        return [asdict(hot_function) for hot_function in hot_functions]
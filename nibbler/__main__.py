@@ -0,0 +1,47 @@
+"""Optimizes packages ahead of time and writes the result to .pyc files.
+
+Modules are executed (constants are only known at runtime), their functions
+and methods are nibbled and the optimized module is written to __pycache__,
+where the import system picks it up as long as the source is unchanged.
+Values of constants can be overridden with a JSON file that maps qualified
+module names to constant values ({"service.settings": {"DEBUG": false}}).
+
+    python -m nibbler [--values FILE] [--passes PASS,...] package [package ...]
+"""
+from argparse import ArgumentParser
+from json import load
+from typing import List
+from typing import Optional
+
+from .config import load_config
+from .precompile import precompile_packages
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = ArgumentParser(
+        prog="python -m nibbler", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("packages", nargs="+", metavar="package")
+    parser.add_argument("--values", help="JSON file with values of constants")
+    parser.add_argument(
+        "--passes", default="", help="comma separated passes (default pipeline)"
+    )
+    parsed = parser.parse_args(arguments)
+
+    values = {}
+    if parsed.values is not None:
+        with open(parsed.values) as file:
+            values = load(file)
+
+    for path in precompile_packages(
+        parsed.packages,
+        load_config(
+            [name.strip() for name in parsed.passes.split(",") if name.strip()]
+        ),
+        values,
+    ):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
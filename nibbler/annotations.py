@@ -4,8 +4,15 @@ from typing import _Immutable
 from typing import _SpecialForm
 from typing import _tp_cache
 from typing import _type_check
+from typing import Optional
 
-__all__ = ["Constant"]
+__all__ = ["Constant", "Stable", "exact_type", "is_marked"]
+
+# Builtin types code can be specialized on (instances of subclasses fail the
+# type guard)
+SPECIALIZABLE_TYPES = frozenset(
+    (bool, bytes, complex, dict, float, frozenset, int, list, set, str, tuple)
+)
 
 
 class SubscriptableAlias(_Final, _Immutable, _root=True):
@@ -48,3 +55,15 @@ class SubscriptableAlias(_Final, _Immutable, _root=True):
 
 
 Constant = SubscriptableAlias("Constant", "Constant marker used by nibbler.")
+Stable = SubscriptableAlias("Stable", "Stable attribute marker used by nibbler.")
+
+
+def is_marked(annotation, marker: SubscriptableAlias) -> bool:
+    # Marked Marker or Marker[SubType]
+    return annotation is marker or getattr(annotation, "__origin__", None) is marker
+
+
+def exact_type(annotation) -> Optional[type]:
+    # int, str, List[int], Dict[str, int], ... (element types aren't checked)
+    origin = getattr(annotation, "__origin__", annotation)
+    return origin if origin in SPECIALIZABLE_TYPES else None
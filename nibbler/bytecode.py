@@ -0,0 +1,392 @@
+from dataclasses import dataclass
+from dataclasses import field
+from dis import findlinestarts
+from dis import stack_effect
+from functools import lru_cache
+from inspect import signature
+from types import CodeType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .constants import CALL_FUNCTION
+from .constants import CALL_FUNCTION_KW
+from .constants import CALL_METHOD
+from .constants import CONST_INSTRUCTIONS
+from .constants import CONTINUE_LOOP
+from .constants import EXTENDED_ARG
+from .constants import HAVE_ARGUMENT
+from .constants import JUMP_ABS_INSTRUCTIONS
+from .constants import JUMP_REL_INSTRUCTIONS
+from .constants import JUMP_STACK_EFFECTS
+from .constants import LOCAL_INSTRUCTIONS
+from .constants import NAME_INSTRUCTIONS
+from .constants import NO_FALLTHROUGH_INSTRUCTIONS
+from .constants import STEP
+from .util import replace_code
+
+__all__ = [
+    "Label",
+    "Instruction",
+    "Bytecode",
+    "find_call",
+    "accepts_bytecode",
+    "as_bytecode",
+    "as_code",
+]
+
+MAX_ARG = 0xFFFFFFFF
+
+
+class Label:
+    """Symbolic jump target, placed in between instructions."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<Label {id(self):#x}>"
+
+
+@dataclass
+class Instruction:
+    op: int
+    # Jump instructions reference a Label instead of an offset
+    arg: Union[int, Label] = 0
+    lineno: Optional[int] = None
+
+    @property
+    def is_jump(self) -> bool:
+        return self.op in JUMP_ABS_INSTRUCTIONS or self.op in JUMP_REL_INSTRUCTIONS
+
+
+def arg_size(arg: int) -> int:
+    if arg < 0 or arg > MAX_ARG:
+        raise ValueError(f"invalid arg value ({arg}) (0 <= arg <= {MAX_ARG})")
+    # Own op plus one EXTENDED_ARG for every additional byte
+    size = 1
+    while arg > 0xFF:
+        arg >>= 8
+        size += 1
+    return size
+
+
+def _index(values: List[str], value: str) -> int:
+    if value in values:
+        return values.index(value)
+    values.append(value)
+    return len(values) - 1
+
+
+def _lnotab(line_starts: List[Tuple[int, int]], firstlineno: int) -> bytes:
+    lnotab = bytearray()
+
+    last_offset, last_lineno = 0, firstlineno
+    for offset, lineno in line_starts:
+        d_offset, d_lineno = offset - last_offset, lineno - last_lineno
+        while d_offset > 255:
+            lnotab += bytes((255, 0))
+            d_offset -= 255
+        # Line increments are signed bytes
+        while d_lineno > 127:
+            lnotab += bytes((d_offset, 127))
+            d_offset, d_lineno = 0, d_lineno - 127
+        while d_lineno < -128:
+            lnotab += bytes((d_offset, -128 & 0xFF))
+            d_offset, d_lineno = 0, d_lineno + 128
+        lnotab += bytes((d_offset, d_lineno & 0xFF))
+
+        last_offset, last_lineno = offset, lineno
+
+    return bytes(lnotab)
+
+
+@dataclass
+class Bytecode:
+    # Code object the instructions were decoded from, supplies all attributes
+    # passes don't touch (argcount, flags, freevars, ...)
+    code: CodeType
+    instructions: List[Union[Instruction, Label]] = field(default_factory=list)
+    consts: List[Any] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    varnames: List[str] = field(default_factory=list)
+
+    # To-Do: Encode 3.11+ bytecode (inline CACHE entries, exception tables,
+    # co_linetable, CALL/PRECALL, relative-only jumps), only the format of
+    # 3.7 is decoded and emitted
+    @classmethod
+    def from_code(cls, code: CodeType) -> "Bytecode":
+        co_code = code.co_code
+
+        # Decode, folding EXTENDED_ARG prefixes into their instruction
+        decoded = []
+        extended_arg = 0
+        start = 0
+        for pos in range(0, len(co_code), STEP):
+            op, arg = co_code[pos], co_code[pos + 1] | extended_arg
+            if op == EXTENDED_ARG:
+                extended_arg = arg << 8
+                continue
+            extended_arg = 0
+
+            target = None
+            if op in JUMP_ABS_INSTRUCTIONS:
+                target = arg
+            elif op in JUMP_REL_INSTRUCTIONS:
+                target = pos + STEP + arg
+
+            decoded.append((start, pos, op, arg if op >= HAVE_ARGUMENT else 0, target))
+            start = pos + STEP
+
+        labels: Dict[int, Label] = {
+            target: Label() for *_, target in decoded if target is not None
+        }
+        line_starts = dict(findlinestarts(code))
+
+        instructions: List[Union[Instruction, Label]] = []
+        lineno = code.co_firstlineno
+        for start, pos, op, arg, target in decoded:
+            # Jumps may target an EXTENDED_ARG prefix or the op itself
+            for offset in range(start, pos + STEP, STEP):
+                if offset in labels:
+                    instructions.append(labels[offset])
+                lineno = line_starts.get(offset, lineno)
+
+            instructions.append(
+                Instruction(op, labels[target] if target is not None else arg, lineno)
+            )
+
+        if len(co_code) in labels:
+            instructions.append(labels[len(co_code)])
+
+        return cls(
+            code,
+            instructions,
+            list(code.co_consts),
+            list(code.co_names),
+            list(code.co_varnames),
+        )
+
+    @property
+    def cells(self) -> Tuple[str, ...]:
+        # Cell and free variables share one index space (LOAD_DEREF, ...)
+        return self.code.co_cellvars + self.code.co_freevars
+
+    def add_const(self, value: Any) -> int:
+        # Equal constants aren't interchangeable (1, 1.0 and True)
+        for index, const in enumerate(self.consts):
+            if const is value:
+                return index
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name: str) -> int:
+        return _index(self.names, name)
+
+    def add_varname(self, name: str) -> int:
+        return _index(self.varnames, name)
+
+    def adopt(
+        self, other: "Bytecode", rename: Callable[[str], str] = lambda name: name
+    ) -> List[Union[Instruction, Label]]:
+        """Remaps the instructions of other onto this one's tables (in place)."""
+        for item in other.instructions:
+            if not isinstance(item, Instruction):
+                continue
+
+            if item.op in CONST_INSTRUCTIONS:
+                item.arg = self.add_const(other.consts[item.arg])
+            elif item.op in LOCAL_INSTRUCTIONS:
+                item.arg = self.add_varname(rename(other.varnames[item.arg]))
+            elif item.op in NAME_INSTRUCTIONS:
+                item.arg = self.add_name(other.names[item.arg])
+
+        return other.instructions
+
+    def _layout(self) -> Tuple[List[int], Dict[Label, int]]:
+        # Number of code units (op + EXTENDED_ARG prefixes) per instruction.
+        # Jump arguments depend on the layout itself, so sizes are grown
+        # until they settle.
+        sizes = [
+            (arg_size(item.arg) if not item.is_jump else 1)
+            if isinstance(item, Instruction)
+            else 0
+            for item in self.instructions
+        ]
+
+        while True:
+            offsets = {}
+            pos = 0
+            for item, size in zip(self.instructions, sizes):
+                if isinstance(item, Label):
+                    offsets[item] = pos
+                pos += size * STEP
+
+            changed = False
+            pos = 0
+            for index, item in enumerate(self.instructions):
+                pos += sizes[index] * STEP
+                if isinstance(item, Instruction) and item.is_jump:
+                    size = arg_size(self._jump_arg(item, offsets, pos))
+                    if size > sizes[index]:
+                        sizes[index] = size
+                        changed = True
+
+            if not changed:
+                return sizes, offsets
+
+    def label_offsets(self) -> Dict[Label, int]:
+        return self._layout()[1]
+
+    @staticmethod
+    def _jump_arg(instruction: Instruction, offsets: Dict[Label, int], end: int):
+        try:
+            target = offsets[instruction.arg]
+        except KeyError:
+            raise ValueError(f"jump to unknown label ({instruction.arg})")
+
+        if instruction.op in JUMP_ABS_INSTRUCTIONS:
+            return target
+
+        if target < end:
+            raise ValueError(f"relative jump to preceding label ({instruction.arg})")
+        return target - end
+
+    def _stacksize(self) -> int:
+        label_indices = {
+            item: index
+            for index, item in enumerate(self.instructions)
+            if isinstance(item, Label)
+        }
+
+        max_depth = 0
+        start_depths: Dict[int, int] = {}
+        pending = [(0, 0)]
+        while pending:
+            start, depth = pending.pop()
+            # Blocks are (re-)walked with the deepest stack they are entered with
+            if start_depths.get(start, -1) >= depth:
+                continue
+            start_depths[start] = depth
+
+            for index in range(start, len(self.instructions)):
+                item = self.instructions[index]
+                if isinstance(item, Label):
+                    if index != start:
+                        pending.append((index, depth))
+                        break
+                    continue
+
+                effect = (
+                    stack_effect(item.op, 0 if item.is_jump else item.arg)
+                    if item.op >= HAVE_ARGUMENT
+                    else stack_effect(item.op)
+                )
+                fallthrough, jump = JUMP_STACK_EFFECTS.get(item.op, (effect, effect))
+
+                # CONTINUE_LOOP unwinds the block stack, its target is always
+                # reached through regular control flow as well
+                if item.is_jump and item.op != CONTINUE_LOOP:
+                    max_depth = max(max_depth, depth + jump)
+                    pending.append((label_indices[item.arg], depth + jump))
+
+                depth += fallthrough
+                max_depth = max(max_depth, depth)
+
+                if item.op in NO_FALLTHROUGH_INSTRUCTIONS:
+                    break
+
+        return max_depth
+
+    def to_code(self) -> CodeType:
+        sizes, offsets = self._layout()
+
+        co_code = bytearray()
+        line_starts = []
+        lineno = None
+        for item, size in zip(self.instructions, sizes):
+            if isinstance(item, Label):
+                continue
+
+            if item.lineno is not None and item.lineno != lineno:
+                lineno = item.lineno
+                line_starts.append((len(co_code), lineno))
+
+            arg = (
+                self._jump_arg(item, offsets, len(co_code) + size * STEP)
+                if item.is_jump
+                else item.arg
+            )
+            # Instructions keep their size, surplus prefixes are zeroed
+            for shift in range(size - 1, 0, -1):
+                co_code += bytes((EXTENDED_ARG, (arg >> (shift * 8)) & 0xFF))
+            co_code += bytes((item.op, arg & 0xFF))
+
+        code = self.code
+        return replace_code(
+            code,
+            co_nlocals=len(self.varnames),
+            co_stacksize=self._stacksize(),
+            co_code=bytes(co_code),
+            co_consts=tuple(self.consts),
+            co_names=tuple(self.names),
+            co_varnames=tuple(self.varnames),
+            co_lnotab=_lnotab(
+                [
+                    (offset, lineno)
+                    for offset, lineno in line_starts
+                    if (offset, lineno) != (0, code.co_firstlineno)
+                ],
+                code.co_firstlineno,
+            ),
+        )
+
+
+def find_call(
+    instructions: List[Union[Instruction, Label]], index: int, method: bool
+) -> Optional[int]:
+    # Position of the call that consumes the function (or method and self)
+    # loaded at index
+    depth = 2 if method else 1
+    for position in range(index + 1, len(instructions)):
+        item = instructions[position]
+        # Arguments have to be straight-line code
+        if not isinstance(item, Instruction) or item.is_jump:
+            return None
+
+        if method:
+            if item.op == CALL_METHOD and depth == item.arg + 2:
+                return position
+        elif (item.op == CALL_FUNCTION and depth == item.arg + 1) or (
+            item.op == CALL_FUNCTION_KW and depth == item.arg + 2
+        ):
+            return position
+
+        depth += (
+            stack_effect(item.op, item.arg)
+            if item.op >= HAVE_ARGUMENT
+            else stack_effect(item.op)
+        )
+        if depth < 1:
+            return None
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def accepts_bytecode(extension: Callable) -> bool:
+    # Extensions opt into the decoded representation by annotating their first
+    # parameter, everything else keeps receiving code objects
+    parameters = list(signature(extension).parameters.values())
+    return bool(parameters) and parameters[0].annotation in (Bytecode, "Bytecode")
+
+
+def as_bytecode(code: Union[CodeType, Bytecode]) -> Bytecode:
+    return code if isinstance(code, Bytecode) else Bytecode.from_code(code)
+
+
+def as_code(code: Union[CodeType, Bytecode]) -> CodeType:
+    return code.to_code() if isinstance(code, Bytecode) else code
@@ -0,0 +1,303 @@
+import sys
+from functools import reduce
+from hashlib import sha256
+from importlib.util import MAGIC_NUMBER
+from marshal import dumps
+from marshal import loads
+from os import getpid
+from os import makedirs
+from os import replace
+from os import unlink
+from os.path import dirname
+from os.path import join
+from pickle import dumps as pickle_dumps
+from pickle import PicklingError
+from sys import implementation
+from types import BuiltinMethodType
+from types import CodeType
+from types import MethodType
+from types import ModuleType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .containers import Context
+from .util import referenced_names
+from .util import with_consts
+
+__all__ = ["CACHE_DIRECTORY", "cached", "cached_all", "dump_code", "load_code"]
+
+# Relative to the directory of the nibbled module (like __pycache__)
+CACHE_DIRECTORY = "__nibblecache__"
+CACHE_SUFFIX = ".nibble"
+# Longest attribute chain on a constant that is substituted (math.sqrt: 2)
+MAX_PATH_LENGTH = 4
+METHOD_TYPES = (BuiltinMethodType, MethodType)
+
+
+def _fingerprint(value: Any) -> Optional[bytes]:
+    try:
+        return dumps(value)
+    except ValueError:
+        pass
+
+    if isinstance(value, ModuleType):
+        return value.__name__.encode()
+    if callable(value) and hasattr(value, "__qualname__"):
+        return f"{getattr(value, '__module__', None)}.{value.__qualname__}".encode() + (
+            dumps(value.__code__) if hasattr(value, "__code__") else b""
+        )
+
+    try:
+        return pickle_dumps(value)
+    except (PicklingError, TypeError, AttributeError):
+        # Values that can't be fingerprinted make the function uncacheable
+        return None
+
+
+def cache_path(module: ModuleType, callable_: Callable) -> Optional[str]:
+    module_file = getattr(module, "__file__", None)
+    if module_file is None:
+        return None
+
+    name = callable_.__qualname__.replace("<", "").replace(">", "")
+    return join(
+        dirname(module_file),
+        CACHE_DIRECTORY,
+        f"{module.__name__}.{name}.{implementation.cache_tag}{CACHE_SUFFIX}",
+    )
+
+
+def cache_key(
+    code: CodeType, context: Context, config: List[Callable]
+) -> Optional[bytes]:
+    key = sha256(MAGIC_NUMBER)
+    try:
+        key.update(dumps(code))
+    except ValueError:
+        return None
+
+    for extension in config:
+        key.update(_fingerprint(extension) or b"")
+    key.update(bytes((context.cache_attributes, context.unroll_loops)))
+    key.update(" ".join(sorted(context.cached_attributes)).encode())
+    key.update(
+        " ".join(
+            f"{name}:{type_.__name__}"
+            for name, type_ in sorted(context.parameter_types.items())
+        ).encode()
+    )
+    for name, value in sorted(context.arguments.items()):
+        fingerprint = _fingerprint(value)
+        if fingerprint is None:
+            return None
+        key.update(name.encode() + fingerprint)
+
+    # Names the optimized code (and code nested within it) might resolve,
+    # inlined functions (and methods) bring their own
+    names = referenced_names(code)
+    inline_functions = {
+        name: function
+        for name, function in (
+            (name, context.inline_functions.get(name) or context.inline_method(name))
+            for name in names
+        )
+        if function is not None
+    }
+    for function in inline_functions.values():
+        names.update(function.__code__.co_names)
+
+    for name in sorted(names):
+        for values in (context.constants, inline_functions):
+            if name in values:
+                fingerprint = _fingerprint(values[name])
+                if fingerprint is None:
+                    return None
+                key.update(name.encode() + fingerprint)
+    # Attributes (unlike constants) are hoisted based on their name alone
+    key.update(" ".join(sorted(names & context.stable_attributes)).encode())
+
+    return key.digest()
+
+
+def _constant_path(const: Any, code: CodeType, context: Context) -> Optional[str]:
+    # Constants and attributes of constants (resolved by constantize_globals)
+    # are found by their (dotted) name, which is part of the names of the code
+    paths = [
+        (name, context.constants[name])
+        for name in code.co_names
+        if name in context.constants
+    ]
+    for _ in range(MAX_PATH_LENGTH):
+        for path, value in paths:
+            # Bound methods are created on every lookup
+            if value is const or (isinstance(const, METHOD_TYPES) and value == const):
+                return path
+
+        paths = [
+            (f"{path}.{name}", getattr(value, name))
+            for path, value in paths
+            for name in code.co_names
+            if hasattr(value, name)
+        ]
+
+    return None
+
+
+def strip(
+    code: CodeType, context: Context
+) -> Optional[Tuple[CodeType, Dict[int, Any]]]:
+    # Constants that can't be marshalled are replaced by their name (or the
+    # substitutions of the nested code object they belong to)
+    consts = list(code.co_consts)
+    substitutions: Dict[int, Any] = {}
+    for index, const in enumerate(consts):
+        if isinstance(const, CodeType):
+            stripped = strip(const, context)
+            if stripped is None:
+                return None
+            consts[index], nested = stripped
+            if nested:
+                substitutions[index] = nested
+            continue
+
+        try:
+            dumps(const)
+        except ValueError:
+            path = _constant_path(const, code, context)
+            if path is None:
+                return None
+            consts[index] = None
+            substitutions[index] = path
+
+    return with_consts(code, consts), substitutions
+
+
+def restore(
+    code: CodeType, substitutions: Dict[int, Any], context: Context
+) -> Optional[CodeType]:
+    consts = list(code.co_consts)
+    for index, substitution in substitutions.items():
+        if isinstance(substitution, dict):
+            consts[index] = restore(consts[index], substitution, context)
+            if consts[index] is None:
+                return None
+        else:
+            name, *attributes = substitution.split(".")
+            if name not in context.constants:
+                return None
+            try:
+                consts[index] = reduce(getattr, attributes, context.constants[name])
+            except AttributeError:
+                return None
+
+    return with_consts(code, consts)
+
+
+def dump_code(code: CodeType, context: Context) -> Optional[bytes]:
+    stripped = strip(code, context)
+    if stripped is None:
+        return None
+
+    try:
+        return dumps(stripped)
+    except ValueError:
+        return None
+
+
+def load_code(data: bytes, context: Context) -> Optional[CodeType]:
+    try:
+        code, substitutions = loads(data)
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    return restore(code, substitutions, context)
+
+
+def load(path: str, key: bytes, context: Context) -> Optional[CodeType]:
+    try:
+        with open(path, "rb") as file:
+            cached_key, data = loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if cached_key != key:
+        return None
+
+    return load_code(data, context)
+
+
+def store(path: str, key: bytes, code: CodeType, context: Context) -> None:
+    if sys.dont_write_bytecode:
+        return
+
+    data = dump_code(code, context)
+    if data is None:
+        return
+
+    # Write atomically, concurrently starting processes may race for the file
+    tmp_path = f"{path}.{getpid()}"
+    try:
+        makedirs(dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as file:
+            file.write(dumps((key, data)))
+        replace(tmp_path, path)
+    except OSError:
+        # Caching is best effort (e.g. read-only file systems)
+        try:
+            unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def cached_all(
+    module: ModuleType,
+    callables: List[Callable],
+    contexts: List[Context],
+    config: List[Callable],
+    optimize_all: Callable[[List[Callable], List[Context]], List[CodeType]],
+) -> List[CodeType]:
+    entries = [
+        (cache_path(module, callable_), cache_key(callable_.__code__, context, config))
+        for callable_, context in zip(callables, contexts)
+    ]
+    codes = [
+        load(path, key, context) if path is not None and key is not None else None
+        for (path, key), context in zip(entries, contexts)
+    ]
+
+    # Only functions that weren't cached are optimized (in one batch)
+    missing = [index for index, code in enumerate(codes) if code is None]
+    optimized = optimize_all(
+        [callables[index] for index in missing], [contexts[index] for index in missing]
+    )
+    for index, code in zip(missing, optimized):
+        codes[index] = code
+
+        path, key = entries[index]
+        if path is not None and key is not None:
+            store(path, key, code, contexts[index])
+
+    return codes
+
+
+def cached(
+    module: ModuleType,
+    callable_: Callable,
+    context: Context,
+    config: List[Callable],
+    optimize: Callable[[CodeType, Context], CodeType],
+) -> CodeType:
+    return cached_all(
+        module,
+        [callable_],
+        [context],
+        config,
+        lambda callables, contexts: [
+            optimize(callable_.__code__, context)
+            for callable_, context in zip(callables, contexts)
+        ],
+    )[0]
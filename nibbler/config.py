@@ -1,25 +1,44 @@
+from importlib import import_module
+from typing import Callable
+from typing import List
+
+from .extension import cache_attributes
 from .extension import constantize_globals
 from .extension import debug  # noqa: F401
+from .extension import eliminate_dead_code
+from .extension import fold_constants
 from .extension import global_to_fast
+from .extension import hoist_invariants
 from .extension import inline
 from .extension import integrity_check
-from .extension import map_source
 from .extension import peephole
 from .extension import precompute_conditionals
+from .extension import unroll_loops
 
-__all__ = ["DEFAULT_CONFIG"]
+__all__ = ["DEFAULT_CONFIG", "load_config"]
 
 DEFAULT_CONFIG = [
     extension.EXTENSION
     for extension in [
         inline,
+        cache_attributes,
         constantize_globals,
+        unroll_loops,
+        fold_constants,
         precompute_conditionals,
         global_to_fast,
+        eliminate_dead_code,
+        hoist_invariants,
         integrity_check,
-        # Provide well-formed lnotab to peephole optimizer
-        map_source,
         peephole,
-        map_source,
     ]
 ]
+
+
+def load_config(passes: List[str]) -> List[Callable]:
+    # Passes by (module) name, the default pipeline if none are given
+    return (
+        [import_module(f".extension.{name}", __package__).EXTENSION for name in passes]
+        if passes
+        else DEFAULT_CONFIG
+    )
@@ -1,18 +1,60 @@
+from opcode import cmp_op
+from opcode import HAVE_ARGUMENT
+from opcode import hasconst
+from opcode import hasjabs
+from opcode import hasjrel
+from opcode import haslocal
+from opcode import hasname
 from opcode import opmap
+from sys import version_info
 
 __all__ = [
     "REVERSE_OPMAP",
+    "SUPPORTED_VERSIONS",
+    "SUPPORTED",
+    "MISSING_OPCODE",
+    "opcode",
+    "compare_op",
+    "BREAK_LOOP",
+    "BUILD_TUPLE",
     "CALL_FUNCTION",
+    "CALL_FUNCTION_KW",
+    "CALL_METHOD",
+    "COMPARE_OP",
+    "CONTINUE_LOOP",
+    "DELETE_DEREF",
+    "DELETE_FAST",
     "EXTENDED_ARG",
+    "FOR_ITER",
+    "GET_ITER",
+    "JUMP_ABSOLUTE",
+    "JUMP_FORWARD",
     "LOAD_CONST",
     "LOAD_FAST",
     "LOAD_GLOBAL",
+    "LOAD_DEREF",
+    "LOAD_ATTR",
+    "LOAD_METHOD",
+    "POP_BLOCK",
     "POP_JUMP_IF_FALSE",
     "POP_JUMP_IF_TRUE",
     "POP_TOP",
     "RETURN_VALUE",
+    "SETUP_LOOP",
+    "STORE_ATTR",
+    "DELETE_ATTR",
+    "STORE_DEREF",
     "STORE_FAST",
     "LOAD_INSTRUCTIONS",
+    "HAVE_ARGUMENT",
+    "CONST_INSTRUCTIONS",
+    "LOCAL_INSTRUCTIONS",
+    "NAME_INSTRUCTIONS",
+    "EXCEPTION_SETUP_INSTRUCTIONS",
+    "JUMP_ABS_INSTRUCTIONS",
+    "JUMP_REL_INSTRUCTIONS",
+    "JUMP_STACK_EFFECTS",
+    "NO_FALLTHROUGH_INSTRUCTIONS",
     "INSTRUCTION_FORMAT",
     "STEP",
     "CODE_TYPE",
@@ -21,21 +63,97 @@ __all__ = [
 
 REVERSE_OPMAP = {value: key for key, value in opmap.items()}
 
-CALL_FUNCTION = opmap["CALL_FUNCTION"]
-EXTENDED_ARG = opmap["EXTENDED_ARG"]
+# Interpreters whose bytecode the passes understand (3.8 removed loop blocks,
+# 3.11 added inline caches, exception tables and CALL/PRECALL), code is left
+# untouched on others
+SUPPORTED_VERSIONS = frozenset(((3, 7),))
+SUPPORTED = version_info[:2] in SUPPORTED_VERSIONS
 
-LOAD_CONST = opmap["LOAD_CONST"]
-LOAD_FAST = opmap["LOAD_FAST"]
-LOAD_GLOBAL = opmap["LOAD_GLOBAL"]
-LOAD_DEREF = opmap["LOAD_DEREF"]
+# Opcode of instructions the running interpreter doesn't have (never matches)
+MISSING_OPCODE = -1
 
-POP_JUMP_IF_FALSE = opmap["POP_JUMP_IF_FALSE"]
-POP_JUMP_IF_TRUE = opmap["POP_JUMP_IF_TRUE"]
-POP_TOP = opmap["POP_TOP"]
-RETURN_VALUE = opmap["RETURN_VALUE"]
-STORE_FAST = opmap["STORE_FAST"]
 
-LOAD_INSTRUCTIONS = [opmap[op] for op in opmap if op.startswith("LOAD_")]
+def opcode(name: str) -> int:
+    return opmap.get(name, MISSING_OPCODE)
+
+
+def compare_op(name: str) -> int:
+    # Comparisons that became instructions of their own (is, in, exception
+    # matching) are missing from cmp_op on later versions
+    return cmp_op.index(name) if name in cmp_op else MISSING_OPCODE
+
+
+BREAK_LOOP = opcode("BREAK_LOOP")
+BUILD_TUPLE = opcode("BUILD_TUPLE")
+CALL_FUNCTION = opcode("CALL_FUNCTION")
+CALL_FUNCTION_KW = opcode("CALL_FUNCTION_KW")
+CALL_METHOD = opcode("CALL_METHOD")
+COMPARE_OP = opcode("COMPARE_OP")
+CONTINUE_LOOP = opcode("CONTINUE_LOOP")
+DELETE_DEREF = opcode("DELETE_DEREF")
+DELETE_FAST = opcode("DELETE_FAST")
+EXTENDED_ARG = opcode("EXTENDED_ARG")
+FOR_ITER = opcode("FOR_ITER")
+GET_ITER = opcode("GET_ITER")
+JUMP_ABSOLUTE = opcode("JUMP_ABSOLUTE")
+JUMP_FORWARD = opcode("JUMP_FORWARD")
+
+LOAD_CONST = opcode("LOAD_CONST")
+LOAD_FAST = opcode("LOAD_FAST")
+LOAD_GLOBAL = opcode("LOAD_GLOBAL")
+LOAD_DEREF = opcode("LOAD_DEREF")
+LOAD_ATTR = opcode("LOAD_ATTR")
+LOAD_METHOD = opcode("LOAD_METHOD")
+
+POP_BLOCK = opcode("POP_BLOCK")
+POP_JUMP_IF_FALSE = opcode("POP_JUMP_IF_FALSE")
+POP_JUMP_IF_TRUE = opcode("POP_JUMP_IF_TRUE")
+POP_TOP = opcode("POP_TOP")
+RETURN_VALUE = opcode("RETURN_VALUE")
+SETUP_LOOP = opcode("SETUP_LOOP")
+STORE_ATTR = opcode("STORE_ATTR")
+DELETE_ATTR = opcode("DELETE_ATTR")
+STORE_DEREF = opcode("STORE_DEREF")
+STORE_FAST = opcode("STORE_FAST")
+
+LOAD_INSTRUCTIONS = [opcode(op) for op in opmap if op.startswith("LOAD_")]
+
+CONST_INSTRUCTIONS = frozenset(hasconst)
+LOCAL_INSTRUCTIONS = frozenset(haslocal)
+NAME_INSTRUCTIONS = frozenset(hasname)
+
+# Blocks that (unlike loops) install exception handlers
+EXCEPTION_SETUP_INSTRUCTIONS = frozenset(
+    opcode(op)
+    for op in ("SETUP_EXCEPT", "SETUP_FINALLY", "SETUP_WITH", "SETUP_ASYNC_WITH")
+)
+
+JUMP_ABS_INSTRUCTIONS = frozenset(hasjabs)
+JUMP_REL_INSTRUCTIONS = frozenset(hasjrel)
+
+# (fall through, jump) stack effects of instructions whose effect differs
+# between both branches (dis.stack_effect only reports the maximum)
+JUMP_STACK_EFFECTS = {
+    opcode("FOR_ITER"): (1, -1),
+    opcode("JUMP_IF_FALSE_OR_POP"): (-1, 0),
+    opcode("JUMP_IF_TRUE_OR_POP"): (-1, 0),
+    opcode("SETUP_EXCEPT"): (0, 6),
+    opcode("SETUP_FINALLY"): (0, 6),
+    opcode("SETUP_WITH"): (1, 6),
+    opcode("SETUP_ASYNC_WITH"): (0, 5),
+}
+
+NO_FALLTHROUGH_INSTRUCTIONS = frozenset(
+    opcode(op)
+    for op in (
+        "BREAK_LOOP",
+        "CONTINUE_LOOP",
+        "JUMP_ABSOLUTE",
+        "JUMP_FORWARD",
+        "RAISE_VARARGS",
+        "RETURN_VALUE",
+    )
+)
 
 INSTRUCTION_FORMAT = "BB"
 STEP = 2
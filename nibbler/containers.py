@@ -3,6 +3,9 @@ from dataclasses import field
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import Mapping
+from typing import Optional
+from typing import Set
 
 __all__ = ["Context"]
 
@@ -10,6 +13,25 @@ __all__ = ["Context"]
 @dataclass
 class Context:
     module_namespace: Dict[str, Any]
-    constants: Dict[str, Any] = field(default_factory=dict)
+    constants: Mapping[str, Any] = field(default_factory=dict)
     inline_functions: Dict[str, Callable] = field(default_factory=dict)
     debug: bool = False
+    pure_functions: Dict[str, Callable] = field(default_factory=dict)
+    # Function that is being nibbled
+    qualname: Optional[str] = None
+    cache_attributes: bool = False
+    # Attribute chains of self (buf, buf.append) that are hoisted out of loops
+    cached_attributes: Set[str] = field(default_factory=set)
+    unroll_loops: bool = False
+    # Exact types of parameters the code is specialized on (checked on entry)
+    parameter_types: Dict[str, type] = field(default_factory=dict)
+    # Values of parameters the code is specialized on (specialize_on)
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    # Attributes annotated Stable (by any class of the module)
+    stable_attributes: Set[str] = field(default_factory=set)
+
+    def inline_method(self, name: str) -> Optional[Callable]:
+        # Inline methods are registered by qualified name (Class.method)
+        if self.qualname is None or "." not in self.qualname:
+            return None
+        return self.inline_functions.get(f"{self.qualname.rsplit('.', 1)[0]}.{name}")
@@ -0,0 +1,75 @@
+from typing import Dict
+from typing import List
+
+from ..bytecode import Bytecode
+from ..bytecode import Instruction
+from ..constants import DELETE_ATTR
+from ..constants import DELETE_FAST
+from ..constants import LOAD_ATTR
+from ..constants import LOAD_FAST
+from ..constants import STORE_ATTR
+from ..constants import STORE_FAST
+from ..containers import Context
+
+__all__ = ["EXTENSION"]
+
+
+def cache_attributes(bytecode: Bytecode, context: Context) -> Bytecode:
+    # Attributes of self (the first argument) that are read repeatedly are
+    # read once when the function is called. Opt-in, as attributes have to
+    # exist at that point and mustn't be changed by code the function calls.
+    if not context.cache_attributes or bytecode.code.co_argcount == 0:
+        return bytecode
+
+    instructions = bytecode.instructions
+    # Attributes that are assigned anywhere (on any object) aren't cached
+    assigned = set()
+    for item in instructions:
+        if isinstance(item, Instruction):
+            if item.op in (STORE_FAST, DELETE_FAST) and item.arg == 0:
+                return bytecode
+            if item.op in (STORE_ATTR, DELETE_ATTR):
+                assigned.add(item.arg)
+
+    reads: Dict[int, List[int]] = {}
+    for index in range(1, len(instructions)):
+        load, attribute = instructions[index - 1 : index + 1]
+        if (
+            isinstance(load, Instruction)
+            and load.op == LOAD_FAST
+            and load.arg == 0
+            and isinstance(attribute, Instruction)
+            and attribute.op == LOAD_ATTR
+            and attribute.arg not in assigned
+        ):
+            reads.setdefault(attribute.arg, []).append(index)
+
+    prologue = []
+    removed = []
+    lineno = next(
+        (item.lineno for item in instructions if isinstance(item, Instruction)), None
+    )
+    for name, indices in reads.items():
+        if len(indices) < 2:
+            continue
+
+        cached = bytecode.add_varname(
+            f"<{bytecode.varnames[0]}.{bytecode.names[name]}>"
+        )
+        prologue += [
+            Instruction(LOAD_FAST, 0, lineno),
+            Instruction(LOAD_ATTR, name, lineno),
+            Instruction(STORE_FAST, cached, lineno),
+        ]
+        for index in indices:
+            instructions[index - 1].arg = cached
+            removed.append(index)
+
+    for index in sorted(removed, reverse=True):
+        del instructions[index]
+    instructions[:0] = prologue
+
+    return bytecode
+
+
+EXTENSION = cache_attributes
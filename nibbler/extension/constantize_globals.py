@@ -1,65 +1,108 @@
-from types import CodeType
+from typing import Any
+from typing import Set
 
-from ..constants import ARG
-from ..constants import EXTENDED_ARG
+from ..bytecode import Bytecode
+from ..bytecode import find_call
+from ..bytecode import Instruction
+from ..constants import CALL_FUNCTION
+from ..constants import DELETE_ATTR
+from ..constants import DELETE_FAST
+from ..constants import LOAD_ATTR
 from ..constants import LOAD_CONST
+from ..constants import LOAD_FAST
 from ..constants import LOAD_GLOBAL
-from ..constants import OP
-from ..constants import STEP
+from ..constants import LOAD_METHOD
+from ..constants import STORE_ATTR
+from ..constants import STORE_FAST
 from ..containers import Context
-from ..util import Offset
-from ..util import pack_op
-from ..util import unpack_op
 
 __all__ = ["EXTENSION"]
 
 
-def constantize_globals(code: CodeType, context: Context) -> CodeType:
-    consts = list(code.co_consts)
+def _fold_attributes(bytecode: Bytecode, index: int, value: Any, assigned: Set[int]):
+    # Attribute chains (math.sqrt, settings.BATCH_SIZE) on constants are
+    # resolved into a single constant as well, unless the function assigns
+    # any of the attributes
+    instructions = bytecode.instructions
+    end = index
+    while end + 1 < len(instructions):
+        item = instructions[end + 1]
+        if (
+            not isinstance(item, Instruction)
+            or item.op not in (LOAD_ATTR, LOAD_METHOD)
+            or item.arg in assigned
+        ):
+            break
+
+        try:
+            attribute = getattr(value, bytecode.names[item.arg])
+        except Exception:
+            # Raised (again) when the function is called
+            break
+
+        # Methods are called like the functions they resolve to
+        if item.op == LOAD_METHOD:
+            call = find_call(instructions, end + 1, True)
+            if call is None:
+                break
+            instructions[call].op = CALL_FUNCTION
+
+        value = attribute
+        end += 1
+        if item.op == LOAD_METHOD:
+            break
+
+    if end != index:
+        instructions[index].arg = bytecode.add_const(value)
+        del instructions[index + 1 : end + 1]
+
+
+def constantize_globals(bytecode: Bytecode, context: Context) -> Bytecode:
     const_map = {}
+    assigned = {
+        instruction.arg
+        for instruction in bytecode.instructions
+        if isinstance(instruction, Instruction)
+        and instruction.op in (STORE_ATTR, DELETE_ATTR)
+    }
+
+    # Parameters the code is specialized on are constant as well, unless the
+    # function assigns them
+    arguments = {
+        bytecode.varnames.index(name): bytecode.add_const(value)
+        for name, value in context.arguments.items()
+        if name in bytecode.varnames
+    }
+    for instruction in bytecode.instructions:
+        if isinstance(instruction, Instruction) and instruction.op in (
+            STORE_FAST,
+            DELETE_FAST,
+        ):
+            arguments.pop(instruction.arg, None)
+
+    for index, instruction in enumerate(bytecode.instructions):
+        if not isinstance(instruction, Instruction):
+            continue
+        if instruction.op == LOAD_FAST and instruction.arg in arguments:
+            instruction.op = LOAD_CONST
+            instruction.arg = arguments[instruction.arg]
+            continue
+        if instruction.op != LOAD_GLOBAL:
+            continue
+
+        name = bytecode.names[instruction.arg]
+        if name in context.constants:
+            if name not in const_map:
+                value = context.constants[name]
+                bytecode.consts.append(value)
+                const_map[name] = len(bytecode.consts) - 1
+
+            instruction.op = LOAD_CONST
+            instruction.arg = const_map[name]
+
+            _fold_attributes(bytecode, index, context.constants[name], assigned)
 
-    ops = []
-
-    offset = Offset()
-    pos = 0
-    while pos < len(code.co_code):
-        op, unpacked_op = unpack_op(code.co_code, pos)
-
-        if unpacked_op[OP] == LOAD_GLOBAL:
-            name = code.co_names[unpacked_op[ARG]]
-            if name in context.constants:
-                if name not in const_map:
-                    value = context.constants[name]
-                    consts.append(value)
-                    const_map[name] = len(consts) - 1
-
-                ops += offset.swap(
-                    pos, unpacked_op, pack_op(LOAD_CONST, const_map[name])
-                )
-            else:
-                ops += pack_op(unpacked_op[OP], unpacked_op[ARG])
-        elif unpacked_op[OP] != EXTENDED_ARG:
-            ops += pack_op(unpacked_op[OP], unpacked_op[ARG])
-
-        pos += STEP
-
-    return CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        code.co_nlocals,
-        code.co_stacksize,
-        code.co_flags,
-        offset.fix_abs_jumps(b"".join(ops)),
-        tuple(consts),
-        code.co_names,
-        code.co_varnames,
-        "<string>",
-        code.co_name,
-        1,
-        b"",
-        code.co_freevars,
-        code.co_cellvars,
-    )
+    return bytecode
 
 
 EXTENSION = constantize_globals
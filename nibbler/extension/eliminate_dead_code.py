@@ -0,0 +1,271 @@
+from inspect import CO_VARARGS
+from inspect import CO_VARKEYWORDS
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+from ..bytecode import Bytecode
+from ..bytecode import Instruction
+from ..bytecode import Label
+from ..constants import BREAK_LOOP
+from ..constants import DELETE_FAST
+from ..constants import EXCEPTION_SETUP_INSTRUCTIONS
+from ..constants import JUMP_ABSOLUTE
+from ..constants import JUMP_FORWARD
+from ..constants import LOAD_CONST
+from ..constants import LOAD_FAST
+from ..constants import LOAD_GLOBAL
+from ..constants import NO_FALLTHROUGH_INSTRUCTIONS
+from ..constants import opcode
+from ..constants import POP_TOP
+from ..constants import SETUP_LOOP
+from ..constants import STORE_FAST
+from ..containers import Context
+
+__all__ = ["EXTENSION"]
+
+# Jumps whose stack effect doesn't depend on where they jump to
+THREADABLE_JUMPS = frozenset(
+    opcode(op)
+    for op in (
+        "JUMP_ABSOLUTE",
+        "JUMP_FORWARD",
+        "POP_JUMP_IF_FALSE",
+        "POP_JUMP_IF_TRUE",
+        "JUMP_IF_FALSE_OR_POP",
+        "JUMP_IF_TRUE_OR_POP",
+    )
+)
+UNCONDITIONAL_JUMPS = frozenset((JUMP_ABSOLUTE, JUMP_FORWARD))
+
+# Builtins that expose the locals of the frame they are called from
+LOCALS_NAMES = frozenset(("dir", "eval", "exec", "locals", "vars"))
+
+Instructions = List[Union[Instruction, Label]]
+
+
+def _positions(instructions: Instructions) -> Dict[Label, int]:
+    return {
+        item: position
+        for position, item in enumerate(instructions)
+        if isinstance(item, Label)
+    }
+
+
+def _target(
+    instructions: Instructions, positions: Dict[Label, int], label: Label
+) -> Optional[Instruction]:
+    # Labels take up no space, jumps land on the next instruction
+    return next(
+        (
+            instructions[position]
+            for position in range(positions[label], len(instructions))
+            if isinstance(instructions[position], Instruction)
+        ),
+        None,
+    )
+
+
+def _thread_jumps(instructions: Instructions) -> None:
+    # Jumps to unconditional jumps go straight to their final target
+    positions = _positions(instructions)
+    for index, item in enumerate(instructions):
+        if not isinstance(item, Instruction) or item.op not in THREADABLE_JUMPS:
+            continue
+
+        label = item.arg
+        seen = set()
+        while label not in seen:
+            seen.add(label)
+            target = _target(instructions, positions, label)
+            if target is None or target.op not in UNCONDITIONAL_JUMPS:
+                break
+            label = target.arg
+
+        item.arg = label
+        # Relative jumps can only go forward
+        if item.op == JUMP_FORWARD and positions[label] < index:
+            item.op = JUMP_ABSOLUTE
+
+
+def _successors(instructions: Instructions) -> List[List[int]]:
+    positions = _positions(instructions)
+    loops = [
+        (index, positions[item.arg])
+        for index, item in enumerate(instructions)
+        if isinstance(item, Instruction) and item.op == SETUP_LOOP
+    ]
+
+    successors: List[List[int]] = []
+    for index, item in enumerate(instructions):
+        following = [index + 1] if index + 1 < len(instructions) else []
+        if isinstance(item, Label):
+            successors.append(following)
+            continue
+
+        targets = [] if item.op in NO_FALLTHROUGH_INSTRUCTIONS else following
+        if item.is_jump:
+            targets = targets + [positions[item.arg]]
+        # Breaks leave the innermost loop
+        elif item.op == BREAK_LOOP:
+            enclosing = [loop for loop in loops if loop[0] < index < loop[1]]
+            targets = [max(enclosing)[1]] if enclosing else []
+        successors.append(targets)
+
+    return successors
+
+
+def _remove_unreachable(instructions: Instructions) -> None:
+    successors = _successors(instructions)
+
+    reachable = set()
+    pending = [0] if instructions else []
+    while pending:
+        index = pending.pop()
+        if index in reachable:
+            continue
+        reachable.add(index)
+        pending += successors[index]
+
+    # Labels are kept, they take up no space
+    instructions[:] = [
+        item
+        for index, item in enumerate(instructions)
+        if index in reachable or isinstance(item, Label)
+    ]
+
+
+def _remove_jumps_to_next(instructions: Instructions) -> None:
+    positions = _positions(instructions)
+    instructions[:] = [
+        item
+        for index, item in enumerate(instructions)
+        if not (
+            isinstance(item, Instruction)
+            and item.op in UNCONDITIONAL_JUMPS
+            and positions[item.arg] > index
+            and all(
+                isinstance(between, Label)
+                for between in instructions[index + 1 : positions[item.arg]]
+            )
+        )
+    ]
+
+
+def _local(bytecode: Bytecode, item: Union[Instruction, Label]) -> Optional[int]:
+    # Local an instruction reads (global_to_fast might not have run yet)
+    if not isinstance(item, Instruction):
+        return None
+    if item.op in (LOAD_FAST, DELETE_FAST):
+        return item.arg
+    if item.op == LOAD_GLOBAL and bytecode.names[item.arg] in bytecode.varnames:
+        return bytecode.varnames.index(bytecode.names[item.arg])
+    return None
+
+
+def _eliminate_dead_stores(bytecode: Bytecode) -> None:
+    instructions = bytecode.instructions
+    if any(name in LOCALS_NAMES for name in bytecode.names):
+        return
+
+    uses = [
+        1 << local if local is not None else 0
+        for local in (_local(bytecode, item) for item in instructions)
+    ]
+    definitions = [
+        1 << item.arg if isinstance(item, Instruction) and item.op == STORE_FAST else 0
+        for item in instructions
+    ]
+
+    # Exception handlers can be entered from anywhere within their block,
+    # locals they might read are considered live throughout
+    always_live = 0
+    if any(
+        isinstance(item, Instruction) and item.op in EXCEPTION_SETUP_INSTRUCTIONS
+        for item in instructions
+    ):
+        for use in uses:
+            always_live |= use
+
+    # Backwards liveness analysis (locals as bits)
+    successors = _successors(instructions)
+    live_in = [0] * len(instructions)
+    changed = True
+    while changed:
+        changed = False
+        for index in reversed(range(len(instructions))):
+            live_out = 0
+            for successor in successors[index]:
+                live_out |= live_in[successor]
+            live = uses[index] | (live_out & ~definitions[index])
+            if live != live_in[index]:
+                live_in[index] = live
+                changed = True
+
+    # Parameters that are never deleted can be loaded without raising
+    code = bytecode.code
+    parameters = code.co_argcount + code.co_kwonlyargcount
+    parameters += bool(code.co_flags & CO_VARARGS)
+    parameters += bool(code.co_flags & CO_VARKEYWORDS)
+    bound = set(range(parameters)) - {
+        item.arg
+        for item in instructions
+        if isinstance(item, Instruction) and item.op == DELETE_FAST
+    }
+
+    def live_after(index: int) -> int:
+        live = always_live
+        for successor in successors[index]:
+            live |= live_in[successor]
+        return live
+
+    removed = set()
+    for index in reversed(range(len(instructions))):
+        item = instructions[index]
+        if not definitions[index]:
+            continue
+
+        following = instructions[index + 1] if index + 1 < len(instructions) else None
+        # Store and load of a value that is only read once leave it on the stack
+        # (unless the load was already removed along with a dead store)
+        if (
+            index + 1 not in removed
+            and isinstance(following, Instruction)
+            and following.op == LOAD_FAST
+            and following.arg == item.arg
+            and not definitions[index] & live_after(index + 1)
+        ):
+            removed.update((index, index + 1))
+        elif not definitions[index] & live_after(index):
+            previous = instructions[index - 1] if index > 0 else None
+            # Loads without side effects are removed along with the store
+            if isinstance(previous, Instruction) and (
+                previous.op == LOAD_CONST
+                or (previous.op == LOAD_FAST and previous.arg in bound)
+            ):
+                removed.update((index - 1, index))
+            else:
+                item.op, item.arg = POP_TOP, 0
+
+    instructions[:] = [
+        item for index, item in enumerate(instructions) if index not in removed
+    ]
+
+
+def eliminate_dead_code(bytecode: Bytecode, context: Context) -> Bytecode:
+    instructions = bytecode.instructions
+
+    size = None
+    while size != len(instructions):
+        size = len(instructions)
+        _thread_jumps(instructions)
+        _remove_unreachable(instructions)
+        _remove_jumps_to_next(instructions)
+
+    _eliminate_dead_stores(bytecode)
+
+    return bytecode
+
+
+EXTENSION = eliminate_dead_code
@@ -0,0 +1,236 @@
+import builtins
+import operator
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from ..bytecode import Bytecode
+from ..bytecode import Instruction
+from ..constants import BUILD_TUPLE
+from ..constants import CALL_FUNCTION
+from ..constants import CALL_FUNCTION_KW
+from ..constants import compare_op
+from ..constants import COMPARE_OP
+from ..constants import LOAD_CONST
+from ..constants import LOAD_GLOBAL
+from ..constants import opcode
+from ..containers import Context
+
+__all__ = ["EXTENSION", "PURE_BUILTINS"]
+
+# Builtins without side effects whose result only depends on their arguments
+PURE_BUILTINS = frozenset(
+    getattr(builtins, name)
+    for name in (
+        "abs",
+        "all",
+        "any",
+        "ascii",
+        "bin",
+        "bool",
+        "bytes",
+        "chr",
+        "complex",
+        "divmod",
+        "float",
+        "format",
+        "frozenset",
+        "hex",
+        "int",
+        "isinstance",
+        "issubclass",
+        "len",
+        "max",
+        "min",
+        "oct",
+        "ord",
+        "pow",
+        "repr",
+        "round",
+        "str",
+        "sum",
+        "tuple",
+    )
+)
+
+UNARY_OPERATORS: Dict[int, Callable[[Any], Any]] = {
+    opcode("UNARY_POSITIVE"): operator.pos,
+    opcode("UNARY_NEGATIVE"): operator.neg,
+    opcode("UNARY_NOT"): operator.not_,
+    opcode("UNARY_INVERT"): operator.invert,
+}
+
+BINARY_OPERATORS: Dict[int, Callable[[Any, Any], Any]] = {
+    opcode("BINARY_POWER"): operator.pow,
+    opcode("BINARY_MULTIPLY"): operator.mul,
+    opcode("BINARY_MATRIX_MULTIPLY"): operator.matmul,
+    opcode("BINARY_MODULO"): operator.mod,
+    opcode("BINARY_ADD"): operator.add,
+    opcode("BINARY_SUBTRACT"): operator.sub,
+    opcode("BINARY_SUBSCR"): operator.getitem,
+    opcode("BINARY_FLOOR_DIVIDE"): operator.floordiv,
+    opcode("BINARY_TRUE_DIVIDE"): operator.truediv,
+    opcode("BINARY_LSHIFT"): operator.lshift,
+    opcode("BINARY_RSHIFT"): operator.rshift,
+    opcode("BINARY_AND"): operator.and_,
+    opcode("BINARY_XOR"): operator.xor,
+    opcode("BINARY_OR"): operator.or_,
+}
+
+COMPARE_OPERATORS: Dict[int, Callable[[Any, Any], Any]] = {
+    compare_op(name): function
+    for name, function in (
+        ("<", operator.lt),
+        ("<=", operator.le),
+        ("==", operator.eq),
+        ("!=", operator.ne),
+        (">", operator.gt),
+        (">=", operator.ge),
+        ("in", lambda left, right: left in right),
+        ("not in", lambda left, right: left not in right),
+        ("is", operator.is_),
+        ("is not", operator.is_not),
+    )
+}
+
+# Same limits as the AST optimizer of CPython, folding must not blow up
+# code objects (or nibble time)
+MAX_INT_SIZE = 128
+MAX_SIZE = 4096
+
+IMMUTABLE_TYPES = (int, float, complex, str, bytes, bool, type(None))
+
+
+def _is_immutable(value: Any) -> bool:
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return isinstance(value, IMMUTABLE_TYPES)
+
+
+def _is_safe(op: int, left: Any, right: Any) -> bool:
+    if isinstance(left, int) and isinstance(right, int):
+        if op == opcode("BINARY_POWER"):
+            return right < 0 or left.bit_length() * right <= MAX_INT_SIZE
+        if op == opcode("BINARY_LSHIFT"):
+            return 0 <= right <= MAX_INT_SIZE
+    if op == opcode("BINARY_MULTIPLY"):
+        for sequence, count in ((left, right), (right, left)):
+            if isinstance(sequence, (str, bytes, tuple)) and isinstance(count, int):
+                return len(sequence) * count <= MAX_SIZE
+    return True
+
+
+def _constant(
+    bytecode: Bytecode, context: Context, item: Any
+) -> Tuple[bool, Optional[Any]]:
+    if isinstance(item, Instruction):
+        if item.op == LOAD_CONST:
+            return True, bytecode.consts[item.arg]
+        # Constant globals that weren't promoted (yet)
+        if item.op == LOAD_GLOBAL and bytecode.names[item.arg] in context.constants:
+            return True, context.constants[bytecode.names[item.arg]]
+    return False, None
+
+
+def _is_pure(function: Any, context: Context) -> bool:
+    return function in PURE_BUILTINS or any(
+        function is pure_function for pure_function in context.pure_functions.values()
+    )
+
+
+def _evaluate(op: int, arg: int, values: List[Any], context: Context) -> Any:
+    if op in UNARY_OPERATORS:
+        return UNARY_OPERATORS[op](*values)
+    if op in BINARY_OPERATORS:
+        if not _is_safe(op, *values):
+            raise ValueError("result too large")
+        return BINARY_OPERATORS[op](*values)
+    if op == COMPARE_OP:
+        return COMPARE_OPERATORS[arg](*values)
+    if op == BUILD_TUPLE:
+        return tuple(values)
+
+    function, *args = values
+    if not _is_pure(function, context):
+        raise ValueError("function is not pure")
+    if op == CALL_FUNCTION_KW:
+        *args, names = args
+        keywords = dict(zip(names, args[len(args) - len(names) :]))
+        return function(*args[: len(args) - len(names)], **keywords)
+    return function(*args)
+
+
+def _operand_count(instruction: Instruction) -> Optional[int]:
+    op, arg = instruction.op, instruction.arg
+    if op in UNARY_OPERATORS:
+        return 1
+    if op in BINARY_OPERATORS or (op == COMPARE_OP and arg in COMPARE_OPERATORS):
+        return 2
+    if op == BUILD_TUPLE:
+        return arg
+    # Function and arguments (and keyword names)
+    if op == CALL_FUNCTION:
+        return arg + 1
+    if op == CALL_FUNCTION_KW:
+        return arg + 2
+    return None
+
+
+def fold_constants(bytecode: Bytecode, context: Context) -> Bytecode:
+    instructions = bytecode.instructions
+
+    index = 0
+    while index < len(instructions):
+        instruction = instructions[index]
+        count = (
+            _operand_count(instruction)
+            if isinstance(instruction, Instruction)
+            else None
+        )
+        start = index - count if count is not None else -1
+
+        # Operands have to be loaded right before the operation (a label in
+        # between means they might not be)
+        operands = (
+            [_constant(bytecode, context, item) for item in instructions[start:index]]
+            if start >= 0
+            else []
+        )
+        if count is None or start < 0 or not all(known for known, _ in operands):
+            index += 1
+            continue
+
+        try:
+            value = _evaluate(
+                instruction.op,
+                instruction.arg,
+                [value for _, value in operands],
+                context,
+            )
+        # Errors are raised at runtime (as they would have been)
+        except Exception:
+            index += 1
+            continue
+
+        if not _is_immutable(value) or (
+            isinstance(value, (str, bytes, tuple)) and len(value) > MAX_SIZE
+        ):
+            index += 1
+            continue
+
+        instructions[start : index + 1] = [
+            Instruction(
+                LOAD_CONST,
+                bytecode.add_const(value),
+                (instructions[start] if count else instruction).lineno,
+            )
+        ]
+        index = start + 1
+
+    return bytecode
+
+
+EXTENSION = fold_constants
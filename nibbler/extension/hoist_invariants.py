@@ -0,0 +1,384 @@
+from inspect import CO_VARARGS
+from inspect import CO_VARKEYWORDS
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from ..bytecode import Bytecode
+from ..bytecode import find_call
+from ..bytecode import Instruction
+from ..bytecode import Label
+from ..constants import CALL_FUNCTION
+from ..constants import DELETE_ATTR
+from ..constants import DELETE_FAST
+from ..constants import LOAD_ATTR
+from ..constants import LOAD_CONST
+from ..constants import LOAD_FAST
+from ..constants import LOAD_METHOD
+from ..constants import opcode
+from ..constants import SETUP_LOOP
+from ..constants import STORE_ATTR
+from ..constants import STORE_FAST
+from ..containers import Context
+
+__all__ = ["EXTENSION", "SAFE_TYPES"]
+
+# Builtin types, whose attributes can't be reassigned (looking up a method
+# that exists can't fail or have side effects)
+SAFE_TYPES = frozenset(
+    (
+        bool,
+        bytearray,
+        bytes,
+        complex,
+        dict,
+        float,
+        frozenset,
+        int,
+        list,
+        set,
+        str,
+        tuple,
+    )
+)
+NUMERIC_TYPES = frozenset((bool, float, int))
+
+# Operations on numbers of the same type that can't raise (unlike division,
+# mixing ints and floats raises OverflowError for large ints)
+NUMERIC_OPERATORS: Dict[int, str] = {
+    opcode("BINARY_ADD"): "+",
+    opcode("BINARY_SUBTRACT"): "-",
+    opcode("BINARY_MULTIPLY"): "*",
+}
+
+BUILD_TYPES: Dict[int, type] = {
+    opcode("BUILD_LIST"): list,
+    opcode("BUILD_SET"): set,
+    opcode("BUILD_MAP"): dict,
+    opcode("BUILD_CONST_KEY_MAP"): dict,
+}
+
+
+class Expression(NamedTuple):
+    # Position of the first instruction that computes the expression
+    start: int
+    # Doubles as the name of the local the expression is hoisted into
+    text: str
+    # Types the value can have (None if unknown)
+    types: Optional[FrozenSet[type]]
+
+
+class Hoisted(NamedTuple):
+    start: int
+    end: int
+    text: str
+    # Method calls become regular calls of the hoisted bound method
+    call: Optional[Instruction]
+
+
+def _local_types(bytecode: Bytecode, context: Context) -> Dict[int, FrozenSet[type]]:
+    # Types of locals that are only ever assigned literals and of parameters
+    # the code is specialized on
+    parameters = bytecode.code.co_argcount + bytecode.code.co_kwonlyargcount
+    parameters += bool(bytecode.code.co_flags & CO_VARARGS)
+    parameters += bool(bytecode.code.co_flags & CO_VARKEYWORDS)
+
+    types: Dict[int, set] = {
+        bytecode.varnames.index(name): {type_}
+        for name, type_ in context.parameter_types.items()
+    }
+    unknown = set(range(parameters)) - types.keys()
+    instructions = bytecode.instructions
+    for index, item in enumerate(instructions):
+        if not isinstance(item, Instruction) or item.op != STORE_FAST:
+            continue
+
+        # Values of stores that are jumped to might come from anywhere
+        previous = instructions[index - 1] if index > 0 else None
+        if not isinstance(previous, Instruction):
+            unknown.add(item.arg)
+        elif previous.op in BUILD_TYPES:
+            types.setdefault(item.arg, set()).add(BUILD_TYPES[previous.op])
+        elif (
+            previous.op == LOAD_CONST
+            and type(bytecode.consts[previous.arg]) in SAFE_TYPES
+        ):
+            types.setdefault(item.arg, set()).add(type(bytecode.consts[previous.arg]))
+        else:
+            unknown.add(item.arg)
+
+    return {
+        local: frozenset(local_types)
+        for local, local_types in types.items()
+        if local not in unknown
+    }
+
+
+def _bound_locals(bytecode: Bytecode, setup: int) -> FrozenSet[int]:
+    # Locals that are certainly bound when the loop is entered: parameters
+    # that are never deleted and locals that are assigned in straight-line
+    # code right before the loop
+    code = bytecode.code
+    instructions = bytecode.instructions
+    deleted = {
+        item.arg
+        for item in instructions
+        if isinstance(item, Instruction) and item.op == DELETE_FAST
+    }
+    bound = set(range(code.co_argcount + code.co_kwonlyargcount)) - deleted
+
+    for item in reversed(instructions[:setup]):
+        if not isinstance(item, Instruction) or item.is_jump:
+            break
+        if item.op == STORE_FAST:
+            bound.add(item.arg)
+
+    return frozenset(bound)
+
+
+def _named_chains(bytecode: Bytecode, context: Context) -> FrozenSet[str]:
+    # Attribute chains of self named by cache_attributes (and their prefixes),
+    # unless the function assigns any of their attributes
+    if bytecode.code.co_argcount == 0:
+        return frozenset()
+
+    assigned = {
+        bytecode.names[item.arg]
+        for item in bytecode.instructions
+        if isinstance(item, Instruction) and item.op in (STORE_ATTR, DELETE_ATTR)
+    }
+    chains = set()
+    for name in context.cached_attributes:
+        attributes = name.split(".")
+        if assigned.isdisjoint(attributes):
+            chains.update(
+                ".".join([bytecode.varnames[0], *attributes[:length]])
+                for length in range(1, len(attributes) + 1)
+            )
+
+    return frozenset(chains)
+
+
+def _is_stable(
+    expression: Expression,
+    attribute: str,
+    context: Context,
+    named_chains: FrozenSet[str],
+) -> bool:
+    if attribute in context.stable_attributes:
+        return True
+    if f"{expression.text}.{attribute}" in named_chains:
+        return True
+
+    # Methods and attributes of builtin types
+    return (
+        expression.types is not None
+        and len(expression.types) == 1
+        and next(iter(expression.types)) in SAFE_TYPES
+        and hasattr(next(iter(expression.types)), attribute)
+    )
+
+
+def _invariants(
+    bytecode: Bytecode,
+    context: Context,
+    body: int,
+    end: int,
+    bound: FrozenSet[int],
+    local_types: Dict[int, FrozenSet[type]],
+    named_chains: FrozenSet[str],
+) -> List[Hoisted]:
+    instructions = bytecode.instructions
+    assigned = {
+        item.arg
+        for item in instructions[body:end]
+        if isinstance(item, Instruction) and item.op in (STORE_FAST, DELETE_FAST)
+    }
+
+    hoisted: List[Hoisted] = []
+    # Straight-line stack of the values that are computed (None for values
+    # that aren't invariant)
+    stack: List[Optional[Expression]] = []
+    for index in range(body, end):
+        item = instructions[index]
+        if not isinstance(item, Instruction) or item.is_jump:
+            stack.clear()
+            continue
+
+        if item.op == LOAD_CONST:
+            # Keyed on the index, as equal constants (1 and True) have to stay
+            # apart
+            value = bytecode.consts[item.arg]
+            stack.append(
+                Expression(
+                    index,
+                    f"consts[{item.arg}]",
+                    frozenset((type(value),)) if type(value) in SAFE_TYPES else None,
+                )
+            )
+        elif item.op == LOAD_FAST:
+            stack.append(
+                Expression(
+                    index, bytecode.varnames[item.arg], local_types.get(item.arg)
+                )
+                if item.arg not in assigned and item.arg in bound
+                else None
+            )
+        elif item.op in (LOAD_ATTR, LOAD_METHOD) and stack:
+            expression = stack.pop()
+            attribute = bytecode.names[item.arg]
+            if expression is None or not _is_stable(
+                expression, attribute, context, named_chains
+            ):
+                stack.clear()
+                continue
+
+            call = (
+                find_call(instructions, index, True) if item.op == LOAD_METHOD else None
+            )
+            if item.op == LOAD_METHOD and call is None:
+                stack.clear()
+                continue
+
+            text = f"{expression.text}.{attribute}"
+            hoisted.append(
+                Hoisted(
+                    expression.start,
+                    index,
+                    text,
+                    instructions[call] if call is not None else None,
+                )
+            )
+            # Method lookups are consumed by their call
+            if item.op == LOAD_METHOD:
+                stack.clear()
+            else:
+                stack.append(Expression(expression.start, text, None))
+        elif item.op in NUMERIC_OPERATORS and len(stack) >= 2:
+            right, left = stack.pop(), stack.pop()
+            if (
+                left is None
+                or right is None
+                or not left.types
+                or left.types != right.types
+                or not left.types <= NUMERIC_TYPES
+                or (float in left.types and len(left.types) > 1)
+            ):
+                stack.append(None)
+                continue
+
+            text = f"({left.text} {NUMERIC_OPERATORS[item.op]} {right.text})"
+            hoisted.append(Hoisted(left.start, index, text, None))
+            stack.append(Expression(left.start, text, left.types | right.types))
+        else:
+            stack.clear()
+
+    # Only the outermost expressions are hoisted
+    return [
+        expression
+        for expression in hoisted
+        if not any(
+            other.start <= expression.start
+            and other.end >= expression.end
+            and other is not expression
+            for other in hoisted
+        )
+    ]
+
+
+def _loop_bounds(
+    instructions: List[Union[Instruction, Label]], setup: int
+) -> Optional[Tuple[int, int]]:
+    end = next(
+        (
+            position
+            for position in range(setup + 1, len(instructions))
+            if instructions[position] is instructions[setup].arg
+        ),
+        None,
+    )
+    # Code in between the loop setup and the first label (the iterable of for
+    # loops) only runs once
+    body = next(
+        (
+            position
+            for position in range(setup + 1, end or 0)
+            if isinstance(instructions[position], Label)
+        ),
+        None,
+    )
+    return (body, end) if body is not None else None
+
+
+def hoist_invariants(bytecode: Bytecode, context: Context) -> Bytecode:
+    # Expressions within loops whose value doesn't change from iteration to
+    # iteration (method lookups on builtin types, attributes annotated Stable
+    # or named by cache_attributes, arithmetic on numbers) are computed once
+    # before the loop and kept in a local
+    instructions = bytecode.instructions
+    local_types = _local_types(bytecode, context)
+    named_chains = _named_chains(bytecode, context)
+    setups = [
+        item
+        for item in instructions
+        if isinstance(item, Instruction) and item.op == SETUP_LOOP
+    ]
+
+    # Outer loops first, expressions that are invariant in the outer loop are
+    # hoisted out of both
+    for setup_instruction in setups:
+        setup = next(
+            position
+            for position, item in enumerate(instructions)
+            if item is setup_instruction
+        )
+        bounds = _loop_bounds(instructions, setup)
+        if bounds is None:
+            continue
+        body, end = bounds
+
+        prologue: List[Instruction] = []
+        prologue_texts = set()
+        for hoisted in reversed(
+            _invariants(
+                bytecode,
+                context,
+                body,
+                end,
+                _bound_locals(bytecode, setup),
+                local_types,
+                named_chains,
+            )
+        ):
+            # Brackets keep hoisted locals apart from renamed ones (inline)
+            local = bytecode.add_varname(f"<{hoisted.text}>")
+            if hoisted.text not in prologue_texts:
+                prologue_texts.add(hoisted.text)
+                computed = [
+                    Instruction(
+                        LOAD_ATTR if item.op == LOAD_METHOD else item.op,
+                        item.arg,
+                        setup_instruction.lineno,
+                    )
+                    for item in instructions[hoisted.start : hoisted.end + 1]
+                ]
+                prologue[:0] = computed + [
+                    Instruction(STORE_FAST, local, setup_instruction.lineno)
+                ]
+
+            if hoisted.call is not None:
+                hoisted.call.op = CALL_FUNCTION
+            instructions[hoisted.start : hoisted.end + 1] = [
+                Instruction(LOAD_FAST, local, instructions[hoisted.start].lineno)
+            ]
+
+        instructions[setup:setup] = prologue
+
+    return bytecode
+
+
+EXTENSION = hoist_invariants
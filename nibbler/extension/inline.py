@@ -1,181 +1,345 @@
+from inspect import CO_ASYNC_GENERATOR
+from inspect import CO_COROUTINE
+from inspect import CO_GENERATOR
+from inspect import CO_ITERABLE_COROUTINE
+from inspect import CO_VARARGS
+from inspect import CO_VARKEYWORDS
 from types import CodeType
 from typing import Any
+from typing import Callable
 from typing import Dict
 from typing import List
-
-from ..constants import ARG
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from ..bytecode import Bytecode
+from ..bytecode import find_call
+from ..bytecode import Instruction
+from ..bytecode import Label
 from ..constants import CALL_FUNCTION
-from ..constants import EXTENDED_ARG
+from ..constants import CALL_FUNCTION_KW
+from ..constants import DELETE_DEREF
+from ..constants import DELETE_FAST
+from ..constants import EXCEPTION_SETUP_INSTRUCTIONS
+from ..constants import JUMP_ABSOLUTE
 from ..constants import LOAD_CONST
+from ..constants import LOAD_DEREF
 from ..constants import LOAD_FAST
 from ..constants import LOAD_GLOBAL
-from ..constants import OP
-from ..constants import STEP
+from ..constants import LOAD_INSTRUCTIONS
+from ..constants import LOAD_METHOD
+from ..constants import POP_TOP
+from ..constants import RETURN_VALUE
+from ..constants import SETUP_LOOP
+from ..constants import STORE_DEREF
 from ..constants import STORE_FAST
 from ..containers import Context
-from ..util import needs_extended
-from ..util import Offset
-from ..util import pack_op
-from ..util import pos_excluding_last_return
-from ..util import previous_op
-from ..util import unpack_op
 
 
 __all__ = ["EXTENSION"]
 
+UNSUPPORTED_FLAGS = (
+    CO_VARARGS
+    | CO_VARKEYWORDS
+    | CO_GENERATOR
+    | CO_COROUTINE
+    | CO_ASYNC_GENERATOR
+    | CO_ITERABLE_COROUTINE
+)
+
+DEREF_INSTRUCTIONS = {
+    LOAD_FAST: LOAD_DEREF,
+    STORE_FAST: STORE_DEREF,
+    DELETE_FAST: DELETE_DEREF,
+}
+
+
+def excluding_last_return(
+    instructions: List[Union[Instruction, Label]]
+) -> List[Union[Instruction, Label]]:
+    kept = list(instructions)
+    # Labels pointing at the trimmed instructions now point past the inlined code
+    labels = []
+
+    # Start from the bottom and exclude return (be it implicit or explicit)
+    returned = False
+    while kept:
+        item = kept[-1]
+        if isinstance(item, Label):
+            labels.insert(0, kept.pop())
+        elif not returned and item.op == RETURN_VALUE:
+            kept.pop()
+            returned = True
+        # Stop trimming LOAD_* instructions as soon as a non LOAD_* instruction
+        # is encountered
+        elif returned and item.op in LOAD_INSTRUCTIONS:
+            kept.pop()
+        else:
+            break
+
+    return kept + labels
+
+
+def _bind(
+    function: Callable, positional: int, keywords: Tuple[str, ...]
+) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+    code = function.__code__
+    positional_names = code.co_varnames[: code.co_argcount]
+    parameters = code.co_varnames[: code.co_argcount + code.co_kwonlyargcount]
+
+    if positional > len(positional_names):
+        return None
+    bound = list(positional_names[:positional]) + list(keywords)
+    if len(set(bound)) != len(bound) or any(
+        name not in parameters for name in keywords
+    ):
+        return None
+
+    defaults = dict(
+        zip(
+            positional_names[
+                len(positional_names) - len(function.__defaults__ or ()) :
+            ],
+            function.__defaults__ or (),
+        )
+    )
+    defaults.update(function.__kwdefaults__ or {})
+
+    missing = [name for name in parameters if name not in bound]
+    # Calls that raise a TypeError are left alone
+    if any(name not in defaults for name in missing):
+        return None
+
+    return bound, {name: defaults[name] for name in missing}
+
+
+def _is_inlineable(inlined: Bytecode) -> bool:
+    code = inlined.code
+    if code.co_flags & UNSUPPORTED_FLAGS or code.co_freevars or code.co_cellvars:
+        return False
+
+    label_positions = {
+        item: position
+        for position, item in enumerate(inlined.instructions)
+        if isinstance(item, Label)
+    }
+    for position, item in enumerate(inlined.instructions):
+        if not isinstance(item, Instruction):
+            continue
+
+        # Returns from within blocks would have to unwind the block stack
+        if item.op in EXCEPTION_SETUP_INSTRUCTIONS:
+            return False
+        if item.op == SETUP_LOOP and any(
+            isinstance(nested, Instruction) and nested.op == RETURN_VALUE
+            for nested in inlined.instructions[position : label_positions[item.arg]]
+        ):
+            return False
+
+    return True
+
+
+def _shadows_globals(inlined: Bytecode, bytecode: Bytecode) -> bool:
+    # global_to_fast would turn globals into locals of the caller
+    return any(
+        isinstance(item, Instruction)
+        and item.op == LOAD_GLOBAL
+        and (
+            inlined.names[item.arg] in bytecode.varnames
+            or inlined.names[item.arg] in bytecode.cells
+        )
+        for item in inlined.instructions
+    )
+
 
 def rewrite_inlined(
-    code: CodeType,
-    consts: Dict[str, Any],
-    names: Dict[str, str],
-    varnames: Dict[str, str],
-) -> List[bytes]:
-    consts_index = len(consts)
-    names_index = len(names)
-    varsnames_index = len(varnames)
-
-    offset = Offset()
-    ops = []
-
-    pos = 0
-    while pos < pos_excluding_last_return(code.co_code):
-        # Fetch and decode operand
-        op, unpacked_op = unpack_op(code.co_code, pos)
-
-        # Remap load indices
-        if unpacked_op[OP] == LOAD_CONST:
-            const = code.co_consts[unpacked_op[ARG]]
-            if const in consts:
-                index = consts.index(const)
-            else:
-                consts.append(code.co_consts[unpacked_op[ARG]])
-                index = consts_index
-                consts_index += 1
-
-            ops += offset.swap(pos, unpacked_op, pack_op(LOAD_CONST, index))
-
-        elif unpacked_op[OP] == STORE_FAST:
-            varname = code.co_varnames[unpacked_op[ARG]]
-            if varname in varnames:
-                index = varnames.index(varname)
-            else:
-                varnames.append(code.co_varnames[unpacked_op[ARG]])
-                index = varsnames_index
-                varsnames_index += 1
-
-            ops += offset.swap(pos, unpacked_op, pack_op(STORE_FAST, index))
-
-        elif unpacked_op[OP] == LOAD_GLOBAL:
-            name = code.co_names[unpacked_op[ARG]]
-            if name in names:
-                index = names.index(name)
-            else:
-                names.append(code.co_names[unpacked_op[ARG]])
-                index = names_index
-                names_index += 1
-
-            ops += offset.swap(pos, unpacked_op, pack_op(LOAD_GLOBAL, index))
-
-        elif unpacked_op[OP] == LOAD_FAST:
-            varname = code.co_varnames[unpacked_op[ARG]]
-            if varname in varnames:
-                index = varnames.index(varname)
-            else:
-                varnames.append(varname)
-                index = varsnames_index
-                varsnames_index += 1
-
-            ops += offset.swap(pos, unpacked_op, pack_op(LOAD_FAST, index))
-
-        elif unpacked_op[OP] != EXTENDED_ARG:
-            ops += pack_op(*unpacked_op)
-
-        pos += STEP
-
-    return offset.fix_abs_jumps(b"".join(ops))
-
-
-def inline(code: CodeType, context: Context) -> CodeType:
-    consts = list(code.co_consts)
-    names = list(code.co_names)
-    varnames = list(code.co_varnames)
-
-    ops = []
-
-    offset = Offset()
-    pos = 0
-    while pos < len(code.co_code):
-        op, unpacked_op = unpack_op(code.co_code, pos)
-
-        # Parameter-less call to inlined function
-        if unpacked_op[OP] == CALL_FUNCTION and unpacked_op[ARG] == 0:
-            # Fetch previous op (ignoring own EXTENDED_ARG)
-            prev_pos, unpacked_prev_op = previous_op(pos, code.co_code)
-            prev_pos = (
-                prev_pos - STEP if needs_extended(unpacked_prev_op[ARG]) else prev_pos
-            )
-
-            if (
-                unpacked_prev_op[OP] == LOAD_GLOBAL
-                and code.co_names[unpacked_prev_op[ARG]] in context.inline_functions
-            ):
-                # Remove all preceding instructions pertaining to the CALL_FUNCTION
-                ops = ops[: -(pos - prev_pos) // STEP]
-
-                # LOAD_, CALL_, POP_TOP
-                offset.strip(prev_pos, pos + (STEP * 2))
-
-                inline_offset = Offset(prev_pos)
-
-                inlined_co_code = inline_offset.fix_abs_jumps(
-                    rewrite_inlined(
-                        context.inline_functions[
-                            code.co_names[unpacked_prev_op[ARG]]
-                        ].__code__,
-                        consts,
-                        names,
-                        varnames,
-                    )
-                )
-
-                inlined_ops = [
-                    inlined_co_code[idx : idx + STEP]
-                    for idx in range(0, len(inlined_co_code) * STEP, STEP)
-                ]
-
-                offset.add(pos, len(inlined_ops) // 2)
-
-                ops += inlined_ops
-
-                # Skip POP_TOP
-                pos += STEP * 2
+    code: CodeType, bytecode: Bytecode
+) -> Optional[List[Union[Instruction, Label]]]:
+    # Inlined code operates on the locals of the caller, including the ones
+    # that are shared with nested functions (cells)
+    inlined = Bytecode.from_code(code)
+    if not _is_inlineable(inlined):
+        return None
+
+    for item in inlined.instructions:
+        if (
+            isinstance(item, Instruction)
+            and item.op in DEREF_INSTRUCTIONS
+            and inlined.varnames[item.arg] in bytecode.cells
+        ):
+            item.op = DEREF_INSTRUCTIONS[item.op]
+            item.arg = bytecode.cells.index(inlined.varnames[item.arg])
+
+    # The result is discarded, early returns jump past the inlined code
+    end = Label()
+    instructions: List[Union[Instruction, Label]] = []
+    for item in excluding_last_return(bytecode.adopt(inlined)):
+        if isinstance(item, Instruction) and item.op == RETURN_VALUE:
+            instructions += [
+                Instruction(POP_TOP, lineno=item.lineno),
+                Instruction(JUMP_ABSOLUTE, end, item.lineno),
+            ]
+        else:
+            instructions.append(item)
+
+    # A label would keep the last store apart from loads of the caller
+    if any(isinstance(item, Instruction) and item.arg is end for item in instructions):
+        instructions.append(end)
+
+    return instructions
+
+
+def rewrite_inlined_call(
+    function: Callable,
+    bytecode: Bytecode,
+    positional: int,
+    keywords: Tuple[str, ...],
+    lineno: Optional[int],
+) -> Optional[List[Union[Instruction, Label]]]:
+    binding = _bind(function, positional, keywords)
+    if binding is None:
+        return None
+    bound, defaults = binding
+
+    inlined = Bytecode.from_code(function.__code__)
+    if not _is_inlineable(inlined) or _shadows_globals(inlined, bytecode):
+        return None
+
+    # Locals are renamed so they can't clash with the ones of the caller
+    def rename(name: str) -> str:
+        return f"{inlined.code.co_name}.{name}"
+
+    bytecode.adopt(inlined, rename)
+
+    # Arguments are on the stack in call order
+    instructions: List[Union[Instruction, Label]] = [
+        Instruction(STORE_FAST, bytecode.add_varname(rename(name)), lineno)
+        for name in reversed(bound)
+    ]
+    for name, value in defaults.items():
+        instructions += [
+            Instruction(LOAD_CONST, bytecode.add_const(value), lineno),
+            Instruction(STORE_FAST, bytecode.add_varname(rename(name)), lineno),
+        ]
+
+    # The return value is left on the stack, early returns jump past the
+    # inlined code
+    end = Label()
+    last = max(
+        position
+        for position, item in enumerate(inlined.instructions)
+        if isinstance(item, Instruction)
+    )
+    for position, item in enumerate(inlined.instructions):
+        if isinstance(item, Instruction) and item.op == RETURN_VALUE:
+            if position == last:
+                continue
+            item.op, item.arg = JUMP_ABSOLUTE, end
+        instructions.append(item)
+
+    return instructions + [end]
+
+
+def _inline_function(
+    bytecode: Bytecode, context: Context, index: int, self_rebound: bool
+) -> Optional[Callable]:
+    load = bytecode.instructions[index]
+    if not isinstance(load, Instruction):
+        return None
+
+    if load.op == LOAD_GLOBAL:
+        return context.inline_functions.get(bytecode.names[load.arg])
+
+    # self.method(...) (as long as self is the first argument)
+    previous = bytecode.instructions[index - 1] if index > 0 else None
+    if (
+        load.op == LOAD_METHOD
+        and not self_rebound
+        and bytecode.code.co_argcount > 0
+        and isinstance(previous, Instruction)
+        and previous.op == LOAD_FAST
+        and previous.arg == 0
+    ):
+        return context.inline_method(bytecode.names[load.arg])
+
+    return None
+
+
+def inline(bytecode: Bytecode, context: Context) -> Bytecode:
+    instructions = bytecode.instructions
+    # Inlined code isn't inlined into again (recursive functions)
+    inlined_items: Set[int] = set()
+    self_rebound = any(
+        isinstance(item, Instruction)
+        and item.op in (STORE_FAST, DELETE_FAST)
+        and item.arg == 0
+        for item in instructions
+    )
 
+    index = 0
+    while index < len(instructions):
+        function = (
+            _inline_function(bytecode, context, index, self_rebound)
+            if id(instructions[index]) not in inlined_items
+            else None
+        )
+        if function is None:
+            index += 1
+            continue
+
+        method = instructions[index].op == LOAD_METHOD
+        call_index = find_call(instructions, index, method)
+        if call_index is None:
+            index += 1
+            continue
+        call = instructions[call_index]
+
+        # Parameter-less call to inlined function (whose result is discarded)
+        pop = (
+            instructions[call_index + 1] if call_index + 1 < len(instructions) else None
+        )
+        if (
+            call.op == CALL_FUNCTION
+            and call.arg == 0
+            and isinstance(pop, Instruction)
+            and pop.op == POP_TOP
+        ):
+            inlined = rewrite_inlined(function.__code__, bytecode)
+            if inlined is None:
+                index += 1
                 continue
 
-            else:
-                ops += pack_op(*unpacked_op)
-        elif unpacked_op[OP] != EXTENDED_ARG:
-            ops += pack_op(*unpacked_op)
-
-        pos += STEP
-
-    return CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        len(varnames),
-        code.co_stacksize,
-        code.co_flags,
-        offset.fix_abs_jumps(b"".join(ops)),
-        tuple(consts),
-        tuple(names),
-        tuple(varnames),
-        "<string>",
-        code.co_name,
-        1,
-        b"",
-        code.co_freevars,
-        code.co_cellvars,
-    )
+            inlined_items.update(id(item) for item in inlined)
+            # LOAD_, CALL_, POP_TOP
+            instructions[index : index + 3] = inlined
+            continue
+
+        # Keyword names are loaded right before the call, self is passed as
+        # first argument to methods
+        start, keywords = call_index, ()
+        if call.op == CALL_FUNCTION_KW:
+            start -= 1
+            keywords = bytecode.consts[instructions[start].arg]
+
+        inlined = rewrite_inlined_call(
+            function,
+            bytecode,
+            call.arg - len(keywords) + (1 if method else 0),
+            keywords,
+            call.lineno,
+        )
+        if inlined is None:
+            index += 1
+            continue
+
+        inlined_items.update(id(item) for item in inlined)
+        # Arguments stay in place (and might contain calls to inline as well)
+        instructions[start : call_index + 1] = inlined
+        del instructions[index]
+
+    return bytecode
 
 
 EXTENSION = inline
@@ -6,6 +6,7 @@ from black import format_str
 from uncompyle6.main import decompile
 
 from ..containers import Context
+from ..util import replace_code
 
 __all__ = ["EXTENSION"]
 
@@ -23,14 +24,9 @@ def map_source(code: CodeType, context: Context) -> CodeType:
         def __repr__(self):
             return self.name
 
-    wrapped_const_code = CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        code.co_nlocals,
-        code.co_stacksize,
-        code.co_flags,
-        code.co_code,
-        tuple(
+    wrapped_const_code = replace_code(
+        code,
+        co_consts=tuple(
             (
                 CallableMock(
                     const.__name__
@@ -42,14 +38,6 @@ def map_source(code: CodeType, context: Context) -> CodeType:
                 for const in code.co_consts
             )
         ),
-        code.co_names,
-        code.co_varnames,
-        code.co_filename,
-        code.co_name,
-        code.co_firstlineno,
-        code.co_lnotab,
-        code.co_freevars,
-        code.co_cellvars,
     )
 
     fn_name = (
@@ -84,22 +72,8 @@ def map_source(code: CodeType, context: Context) -> CodeType:
     # Compile code to obtain line-to-op mapping (co_lnotab)
     tmp_code = compile(wrapped_fn_code, tmp_file.name, "exec").co_consts[0]
 
-    return CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        code.co_nlocals,
-        code.co_stacksize,
-        code.co_flags,
-        code.co_code,
-        code.co_consts,
-        code.co_names,
-        code.co_varnames,
-        tmp_file.name,
-        code.co_name,
-        1,
-        tmp_code.co_lnotab,
-        code.co_freevars,
-        code.co_cellvars,
+    return replace_code(
+        code, co_filename=tmp_file.name, co_firstlineno=1, co_lnotab=tmp_code.co_lnotab
     )
 
 
@@ -3,14 +3,20 @@ from ctypes import pythonapi
 from types import CodeType
 
 from ..containers import Context
+from ..util import replace_code
 
-_PyCode_Optimize = pythonapi.PyCode_Optimize
-_PyCode_Optimize.restype = py_object
+# Not part of the C API anymore since 3.10
+_PyCode_Optimize = getattr(pythonapi, "PyCode_Optimize", None)
+if _PyCode_Optimize is not None:
+    _PyCode_Optimize.restype = py_object
 
 __all__ = ["EXTENSION"]
 
 
 def peephole(code: CodeType, context: Context) -> CodeType:
+    if _PyCode_Optimize is None:
+        return code
+
     co_consts = list(code.co_consts)
     co_code = _PyCode_Optimize(
         py_object(code.co_code),
@@ -18,23 +24,7 @@ def peephole(code: CodeType, context: Context) -> CodeType:
         py_object(code.co_names),
         py_object(code.co_lnotab),
     )
-    return CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        code.co_nlocals,
-        code.co_stacksize,
-        code.co_flags,
-        co_code,
-        tuple(co_consts),
-        code.co_names,
-        code.co_varnames,
-        code.co_filename,
-        code.co_name,
-        code.co_firstlineno,
-        code.co_lnotab,
-        code.co_freevars,
-        code.co_cellvars,
-    )
+    return replace_code(code, co_code=co_code, co_consts=tuple(co_consts))
 
 
 EXTENSION = peephole
@@ -1,96 +1,82 @@
-from types import CodeType
+from itertools import chain
 
-from ..constants import ARG
-from ..constants import EXTENDED_ARG
+from ..bytecode import Bytecode
+from ..bytecode import Instruction
+from ..constants import JUMP_ABSOLUTE
 from ..constants import LOAD_CONST
 from ..constants import LOAD_GLOBAL
-from ..constants import OP
 from ..constants import POP_JUMP_IF_FALSE
 from ..constants import POP_JUMP_IF_TRUE
-from ..constants import STEP
 from ..containers import Context
-from ..util import needs_extended
-from ..util import Offset
-from ..util import pack_op
-from ..util import previous_op
-from ..util import unpack_op
 
 __all__ = ["EXTENSION"]
 
 
-def precompute_conditionals(code: CodeType, context: Context) -> CodeType:
-    ops = []
+def precompute_conditionals(bytecode: Bytecode, context: Context) -> Bytecode:
+    instructions = bytecode.instructions
 
-    offset = Offset()
-    pos = 0
-    while pos < len(code.co_code):
-        op, unpacked_op = unpack_op(code.co_code, pos)
+    index = 1
+    while index < len(instructions):
+        load, jump = instructions[index - 1 : index + 1]
 
-        if unpacked_op[OP] in (POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE):
-            # Fetch previous op (ignoring own EXTENDED_ARG)
-            prev_pos, unpacked_prev_op = previous_op(pos, code.co_code)
-            prev_pos = (
-                prev_pos - STEP if needs_extended(unpacked_prev_op[ARG]) else prev_pos
-            )
-
-            # Only apply conditional precomputing for globals that were marked constant or
-            # constants (which the peephole optimizer ignored)
-            if (
+        # Only apply conditional precomputing for globals that were marked constant or
+        # constants (which the peephole optimizer ignored)
+        if (
+            isinstance(jump, Instruction)
+            and jump.op in (POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE)
+            and isinstance(load, Instruction)
+            and (
                 (
-                    unpacked_prev_op[OP] == LOAD_GLOBAL
-                    and code.co_names[unpacked_prev_op[ARG]] in context.constants
-                )
-                or unpacked_prev_op[OP] == LOAD_CONST
-                # To-Do: Support "negative" jumps
-                and unpacked_op[ARG] > pos
-            ):
-                value = (
-                    context.constants[code.co_names[unpacked_prev_op[ARG]]]
-                    if unpacked_prev_op[OP] == LOAD_GLOBAL
-                    else code.co_consts[unpacked_prev_op[ARG]]
+                    load.op == LOAD_GLOBAL
+                    and bytecode.names[load.arg] in context.constants
                 )
-                # Reuse same logic for IF_TRUE and IF_FALSE
-                if unpacked_op[OP] == POP_JUMP_IF_FALSE:
-                    value = not value
-
-                # Remove all preceding instructions pertaining to the CALL_FUNCTION
-                ops = ops[: -(pos - prev_pos) // STEP]
-
-                # Skip entire block
-                if value:
-                    offset.strip(prev_pos, unpacked_op[ARG])
-
-                    pos = unpacked_op[ARG]
-
-                    continue
-                # Skip jump instruction
-                else:
-                    offset.strip(prev_pos, pos + STEP)
+                or load.op == LOAD_CONST
+            )
+        ):
+            target = next(
+                (
+                    position
+                    # Forward jumps are far more common
+                    for position in chain(
+                        range(index + 1, len(instructions)), range(index)
+                    )
+                    if instructions[position] is jump.arg
+                ),
+                None,
+            )
 
+            value = (
+                context.constants[bytecode.names[load.arg]]
+                if load.op == LOAD_GLOBAL
+                else bytecode.consts[load.arg]
+            )
+            # Reuse same logic for IF_TRUE and IF_FALSE
+            if jump.op == POP_JUMP_IF_FALSE:
+                value = not value
+
+            # Skip jump instruction
+            if not value:
+                del instructions[index - 1 : index + 1]
+            # Skip entire block (labels are kept in place, they take up no space)
+            elif target > index:
+                instructions[index - 1 : target] = [
+                    item
+                    for item in instructions[index + 1 : target]
+                    if not isinstance(item, Instruction)
+                ]
+            # "Negative" jumps become unconditional, the code following them
+            # is removed by eliminate_dead_code
             else:
-                ops += pack_op(*unpacked_op)
-        elif unpacked_op[OP] != EXTENDED_ARG:
-            ops += pack_op(*unpacked_op)
+                instructions[index - 1 : index + 1] = [
+                    Instruction(JUMP_ABSOLUTE, jump.arg, jump.lineno)
+                ]
+
+            index = max(index - 1, 1)
+            continue
 
-        pos += STEP
+        index += 1
 
-    return CodeType(
-        code.co_argcount,
-        code.co_kwonlyargcount,
-        code.co_nlocals,
-        code.co_stacksize,
-        code.co_flags,
-        offset.fix_abs_jumps(b"".join(ops)),
-        code.co_consts,
-        code.co_names,
-        code.co_varnames,
-        "<string>",
-        code.co_name,
-        1,
-        b"",
-        code.co_freevars,
-        code.co_cellvars,
-    )
+    return bytecode
 
 
 EXTENSION = precompute_conditionals
@@ -0,0 +1,193 @@
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from ..bytecode import Bytecode
+from ..bytecode import Instruction
+from ..bytecode import Label
+from ..constants import BREAK_LOOP
+from ..constants import CALL_FUNCTION
+from ..constants import CONTINUE_LOOP
+from ..constants import DELETE_FAST
+from ..constants import FOR_ITER
+from ..constants import GET_ITER
+from ..constants import LOAD_CONST
+from ..constants import LOAD_FAST
+from ..constants import POP_BLOCK
+from ..constants import SETUP_LOOP
+from ..constants import STORE_FAST
+from ..containers import Context
+
+__all__ = ["EXTENSION", "MAX_ITERATIONS", "MAX_UNROLLED_SIZE"]
+
+# Iterables that are iterated in a fixed order and can't be changed by the
+# loop body (sets are left out, their order depends on hash randomization)
+UNROLLABLE_TYPES = frozenset((bytes, range, str, tuple))
+
+# Size budget, loops are only unrolled if the body is replicated at most
+# MAX_ITERATIONS times and takes up at most MAX_UNROLLED_SIZE instructions
+MAX_ITERATIONS = 32
+MAX_UNROLLED_SIZE = 256
+
+Instructions = List[Union[Instruction, Label]]
+
+
+def _elements(bytecode: Bytecode, iterable: Instructions) -> Optional[Tuple]:
+    # Elements of a constant iterable or of range() with constant arguments
+    if not iterable or not all(isinstance(item, Instruction) for item in iterable):
+        return None
+
+    *loads, last = iterable
+    try:
+        if not loads and last.op == LOAD_CONST:
+            value = bytecode.consts[last.arg]
+        elif (
+            last.op == CALL_FUNCTION
+            and 2 <= len(loads) <= 4
+            and last.arg == len(loads) - 1
+            and all(item.op == LOAD_CONST for item in loads)
+            and bytecode.consts[loads[0].arg] is range
+            and all(type(bytecode.consts[item.arg]) is int for item in loads[1:])
+        ):
+            value = range(*(bytecode.consts[item.arg] for item in loads[1:]))
+        else:
+            return None
+
+        if type(value) not in UNROLLABLE_TYPES or len(value) > MAX_ITERATIONS:
+            return None
+    # Zero steps and ranges that are too long to measure
+    except (ValueError, OverflowError):
+        return None
+
+    return tuple(value)
+
+
+def _unroll(bytecode: Bytecode, setup: int) -> Optional[Tuple[int, int, Instructions]]:
+    # Loops of the form:
+    #   SETUP_LOOP end; <iterable>; GET_ITER; top: FOR_ITER exit;
+    #   <body>; exit: POP_BLOCK; <else>; end:
+    # become
+    #   [SETUP_LOOP end]; LOAD_CONST element; <body>; next: ...; exit:
+    #   [POP_BLOCK]; <else>; end:
+    instructions = bytecode.instructions
+
+    get_iter = setup + 1
+    while (
+        get_iter < len(instructions)
+        and isinstance(instructions[get_iter], Instruction)
+        and instructions[get_iter].op != GET_ITER
+    ):
+        get_iter += 1
+    if get_iter == len(instructions) or isinstance(instructions[get_iter], Label):
+        return None
+
+    for_iter = get_iter + 1
+    while for_iter < len(instructions) and isinstance(instructions[for_iter], Label):
+        for_iter += 1
+    if for_iter == len(instructions) or instructions[for_iter].op != FOR_ITER:
+        return None
+    tops = set(instructions[get_iter + 1 : for_iter])
+
+    exit_ = next(
+        (
+            position
+            for position in range(for_iter + 1, len(instructions))
+            if instructions[position] is instructions[for_iter].arg
+        ),
+        None,
+    )
+    if (
+        exit_ is None
+        or exit_ + 1 == len(instructions)
+        or not isinstance(instructions[exit_ + 1], Instruction)
+        or instructions[exit_ + 1].op != POP_BLOCK
+    ):
+        return None
+
+    elements = _elements(bytecode, instructions[setup + 1 : get_iter])
+    body = instructions[for_iter + 1 : exit_]
+    if elements is None or len(elements) * (len(body) + 1) > MAX_UNROLLED_SIZE:
+        return None
+
+    # Jumps out of the body (other than continue) aren't unrolled
+    labels = {item for item in body if isinstance(item, Label)}
+    if any(
+        isinstance(item, Instruction)
+        and item.is_jump
+        and item.arg not in labels
+        and item.arg not in tops
+        for item in body
+    ):
+        return None
+
+    # The loop variable is a constant within each copy of the body if the
+    # body doesn't assign it
+    variable = (
+        body[0].arg
+        if body
+        and isinstance(body[0], Instruction)
+        and body[0].op == STORE_FAST
+        and not any(
+            isinstance(item, Instruction)
+            and item.op in (STORE_FAST, DELETE_FAST)
+            and item.arg == body[0].arg
+            for item in body[1:]
+        )
+        else None
+    )
+
+    lineno = instructions[for_iter].lineno
+    unrolled: Instructions = []
+    for element in elements:
+        element_const = bytecode.add_const(element)
+        following = Label()
+        renamed = {label: Label() for label in labels}
+        renamed.update({top: following for top in tops})
+
+        unrolled.append(Instruction(LOAD_CONST, element_const, lineno))
+        for index, item in enumerate(body):
+            if isinstance(item, Label):
+                unrolled.append(renamed[item])
+            elif item.is_jump:
+                unrolled.append(Instruction(item.op, renamed[item.arg], item.lineno))
+            elif index > 0 and item.op == LOAD_FAST and item.arg == variable:
+                unrolled.append(Instruction(LOAD_CONST, element_const, item.lineno))
+            else:
+                unrolled.append(Instruction(item.op, item.arg, item.lineno))
+        unrolled.append(following)
+    unrolled.append(instructions[exit_])
+
+    # Loop blocks are only needed for break and continue
+    if any(
+        isinstance(item, Instruction) and item.op in (BREAK_LOOP, CONTINUE_LOOP)
+        for item in body
+    ):
+        return setup + 1, exit_ + 1, unrolled
+    return setup, exit_ + 2, unrolled
+
+
+def unroll_loops(bytecode: Bytecode, context: Context) -> Bytecode:
+    # Loops over small constant iterables (Constant[tuple] globals, range()
+    # with constant bounds) are replaced by a copy of the body per element,
+    # with the element loaded as a constant. Opt-in, as it trades code size
+    # for speed.
+    if not context.unroll_loops:
+        return bytecode
+
+    instructions = bytecode.instructions
+    # Inner loops first, the budget of outer loops includes unrolled ones
+    for setup in reversed(range(len(instructions))):
+        item = instructions[setup]
+        if not isinstance(item, Instruction) or item.op != SETUP_LOOP:
+            continue
+
+        unrolled = _unroll(bytecode, setup)
+        if unrolled is not None:
+            start, end, replacement = unrolled
+            instructions[start:end] = replacement
+
+    return bytecode
+
+
+EXTENSION = unroll_loops
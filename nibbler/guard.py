@@ -0,0 +1,159 @@
+from threading import Lock
+from types import CodeType
+from types import FunctionType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from .bytecode import Bytecode
+from .bytecode import Instruction
+from .bytecode import Label
+from .constants import CALL_FUNCTION
+from .constants import compare_op
+from .constants import COMPARE_OP
+from .constants import LOAD_CONST
+from .constants import LOAD_FAST
+from .constants import LOAD_GLOBAL
+from .constants import POP_JUMP_IF_FALSE
+from .constants import POP_TOP
+from .containers import Context
+from .util import global_names
+
+__all__ = ["Guard", "guarded_names", "type_guarded_code"]
+
+# Functions whose globals keep changing aren't worth specializing
+MAX_SPECIALIZATIONS = 8
+
+IS = compare_op("is")
+
+
+def guarded_names(
+    code: CodeType, context: Context, specialized: Optional[CodeType] = None
+) -> Set[str]:
+    # Globals the code (and code nested within it) loads that might have been
+    # resolved, inlined functions bring their own. Globals the specialized code
+    # still loads (as well as attribute names) don't need guards.
+    names = global_names(code)
+    for name in list(names):
+        if name in context.inline_functions:
+            names |= global_names(context.inline_functions[name].__code__)
+    if specialized is not None:
+        names -= global_names(specialized)
+
+    return {
+        name
+        for name in names
+        if name in context.constants or name in context.inline_functions
+    }
+
+
+def guarded_code(
+    original: CodeType,
+    specialized: CodeType,
+    guards: Dict[str, Any],
+    deoptimize: Callable[[], None],
+) -> CodeType:
+    bytecode = Bytecode.from_code(specialized)
+    fallback = Label()
+
+    # Globals still have to be the objects the code was specialized on
+    # (LOAD_GLOBAL falls back to builtins, which covers shadowing as well)
+    prologue = []
+    for name, value in guards.items():
+        prologue += [
+            Instruction(LOAD_GLOBAL, bytecode.add_name(name)),
+            Instruction(LOAD_CONST, bytecode.add_const(value)),
+            Instruction(COMPARE_OP, IS),
+            Instruction(POP_JUMP_IF_FALSE, fallback),
+        ]
+
+    # The current call continues with the original code, both share locals
+    bytecode.instructions = (
+        prologue
+        + bytecode.instructions
+        + [
+            fallback,
+            Instruction(LOAD_CONST, bytecode.add_const(deoptimize)),
+            Instruction(CALL_FUNCTION, 0),
+            Instruction(POP_TOP),
+        ]
+        + bytecode.adopt(Bytecode.from_code(original))
+    )
+
+    return bytecode.to_code()
+
+
+def type_guarded_code(
+    generic: CodeType, specialized: CodeType, types: Dict[str, type]
+) -> CodeType:
+    bytecode = Bytecode.from_code(specialized)
+    fallback = Label()
+
+    # Parameters have to be of exactly the types the code was specialized on
+    # (type is a constant, globals could shadow it)
+    prologue = []
+    for name, type_ in types.items():
+        prologue += [
+            Instruction(LOAD_CONST, bytecode.add_const(type)),
+            Instruction(LOAD_FAST, bytecode.add_varname(name)),
+            Instruction(CALL_FUNCTION, 1),
+            Instruction(LOAD_CONST, bytecode.add_const(type_)),
+            Instruction(COMPARE_OP, IS),
+            Instruction(POP_JUMP_IF_FALSE, fallback),
+        ]
+
+    # Unlike globals, types can differ from call to call, calls that fail a
+    # guard run the generic code (both share locals)
+    bytecode.instructions = (
+        prologue
+        + bytecode.instructions
+        + [fallback]
+        + bytecode.adopt(Bytecode.from_code(generic))
+    )
+
+    return bytecode.to_code()
+
+
+class Guard:
+    """Keeps a function specialized on the globals it depends on.
+
+    Specialized code is prefixed with guards that compare the globals to the
+    objects it was specialized on. Once a guard fails the function is
+    specialized anew (or falls back to its original code for good after
+    MAX_SPECIALIZATIONS attempts).
+    """
+
+    def __init__(
+        self,
+        original: CodeType,
+        specialize: Callable[[], Tuple[CodeType, Dict[str, Any]]],
+    ):
+        self._original = original
+        self._specialize = specialize
+        self._lock = Lock()
+
+        self.specializations = 0
+        # Set once the function the code is used by exists
+        self.function: Optional[FunctionType] = None
+
+    def code(self) -> CodeType:
+        specialized, guards = self._specialize()
+        self.specializations += 1
+
+        # Code that didn't change doesn't depend on any globals
+        return (
+            guarded_code(self._original, specialized, guards, self)
+            if guards and specialized != self._original
+            else specialized
+        )
+
+    def __call__(self) -> None:
+        with self._lock:
+            self.function.__code__ = (
+                self.code()
+                if self.specializations < MAX_SPECIALIZATIONS
+                else self._original
+            )
@@ -0,0 +1,133 @@
+import sys
+from configparser import ConfigParser
+from importlib.abc import Loader
+from importlib.abc import MetaPathFinder
+from types import ModuleType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from warnings import warn
+
+from . import Nibbler
+from .config import DEFAULT_CONFIG
+from .config import load_config
+from .namespace import module_functions
+
+__all__ = ["NibbleFinder", "install", "install_from_file", "uninstall"]
+
+CONFIG_SECTION = "nibbler"
+
+
+def nibble_module(module: ModuleType, **options: Any) -> None:
+    try:
+        nibbler = Nibbler(vars(module), **options)
+        context = nibbler.context
+    except Exception as error:
+        warn(f"could not nibble module '{module.__name__}' ({error})", RuntimeWarning)
+        return
+
+    # Unlike Nibbler.nibble_module a single function can't fail the import
+    for function in module_functions(vars(module), module.__name__):
+        try:
+            # Functions are optimized in place, references held elsewhere
+            # (decorators, other modules) pick up the optimized code as well
+            function.__code__ = nibbler.nibble_code(function, context)
+        except Exception as error:
+            warn(
+                f"could not nibble '{module.__name__}.{function.__qualname__}' "
+                f"({error})",
+                RuntimeWarning,
+            )
+
+
+class NibbleLoader(Loader):
+    def __init__(self, loader: Loader, options: Dict[str, Any]):
+        self._loader = loader
+        self._options = options
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self._loader.exec_module(module)
+        # Constants are only known once the module has been executed
+        nibble_module(module, **self._options)
+
+    def __getattr__(self, name: str) -> Any:
+        # get_source, is_package, get_resource_reader, ...
+        return getattr(self._loader, name)
+
+
+class NibbleFinder(MetaPathFinder):
+    """Nibbles every module in the configured packages when it's imported."""
+
+    def __init__(self, packages: List[str], **options: Any):
+        self._packages = packages
+        self._options = options
+
+    def _matches(self, fullname: str) -> bool:
+        return any(
+            fullname == package or fullname.startswith(f"{package}.")
+            for package in self._packages
+        )
+
+    def find_spec(self, fullname, path, target=None):
+        if not self._matches(fullname):
+            return None
+
+        # Regular finders locate the module, its loader is wrapped
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = NibbleLoader(spec.loader, self._options)
+                return spec
+
+        return None
+
+
+def install(
+    packages: List[str],
+    config: List[Callable] = DEFAULT_CONFIG,
+    deep_copy: bool = True,
+    cache: bool = False,
+) -> NibbleFinder:
+    finder = NibbleFinder(
+        list(packages), config=config, deep_copy=deep_copy, cache=cache
+    )
+    sys.meta_path.insert(0, finder)
+
+    return finder
+
+
+def install_from_file(path: str) -> NibbleFinder:
+    parser = ConfigParser()
+    if not parser.read(path):
+        # To-Do: Subclass ValueError
+        raise ValueError(f"config file '{path}' could not be read")
+    if not parser.has_section(CONFIG_SECTION):
+        # To-Do: Subclass ValueError
+        raise ValueError(f"config file '{path}' has no [{CONFIG_SECTION}] section")
+
+    section = parser[CONFIG_SECTION]
+
+    def names(option: str) -> List[str]:
+        return [
+            name.strip() for name in section.get(option, "").split(",") if name.strip()
+        ]
+
+    return install(
+        names("packages"),
+        config=load_config(names("passes")),
+        deep_copy=section.getboolean("deep_copy", True),
+        cache=section.getboolean("cache", False),
+    )
+
+
+def uninstall(finder: NibbleFinder) -> None:
+    if finder in sys.meta_path:
+        sys.meta_path.remove(finder)
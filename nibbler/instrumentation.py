@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from dataclasses import field
+from time import perf_counter
+from types import CodeType
+from typing import Callable
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from .bytecode import Bytecode
+from .bytecode import Instruction
+from .constants import LOAD_GLOBAL
+from .containers import Context
+
+__all__ = ["PassReport", "FunctionReport", "instrumented"]
+
+
+@dataclass
+class PassReport:
+    name: str
+    # Wall time in seconds (including conversion between representations)
+    time: float
+    instructions_before: int
+    instructions_after: int
+    jumps_relocated: int
+    constants_added: int
+    globals_removed: int
+
+
+@dataclass
+class FunctionReport:
+    function: str
+    passes: List[PassReport] = field(default_factory=list)
+
+
+@dataclass
+class _Snapshot:
+    # Passes modify instructions in place, so everything is counted upfront
+    instructions: int
+    consts: int
+    globals: int
+    # (Instruction identity, target offset) of every jump
+    jumps: List[Tuple[int, int]]
+    # Keeps instructions alive, so that identities aren't reused
+    references: List[Instruction]
+
+    @classmethod
+    def of(cls, code: Union[CodeType, Bytecode]) -> "_Snapshot":
+        bytecode = code if isinstance(code, Bytecode) else Bytecode.from_code(code)
+        offsets = bytecode.label_offsets()
+        instructions = [
+            item for item in bytecode.instructions if isinstance(item, Instruction)
+        ]
+
+        return cls(
+            len(instructions),
+            len(bytecode.consts),
+            sum(1 for instruction in instructions if instruction.op == LOAD_GLOBAL),
+            [
+                (id(instruction), offsets[instruction.arg])
+                for instruction in instructions
+                if instruction.is_jump
+            ],
+            instructions,
+        )
+
+
+def _jumps_relocated(before: _Snapshot, after: _Snapshot, in_place: bool) -> int:
+    # Passes that modify the decoded representation in place keep instruction
+    # identities, otherwise jumps can only be matched up by position
+    if in_place:
+        targets = dict(before.jumps)
+        return sum(
+            1
+            for key, offset in after.jumps
+            if key in targets and targets[key] != offset
+        )
+
+    return sum(
+        1
+        for (_, before_offset), (_, after_offset) in zip(before.jumps, after.jumps)
+        if before_offset != after_offset
+    )
+
+
+def instrumented(
+    extension: Callable,
+    code: Union[CodeType, Bytecode],
+    convert: Callable[[Union[CodeType, Bytecode]], Union[CodeType, Bytecode]],
+    context: Context,
+) -> Tuple[Union[CodeType, Bytecode], PassReport]:
+    start = perf_counter()
+    code = convert(code)
+    conversion_time = perf_counter() - start
+
+    before = _Snapshot.of(code)
+
+    start = perf_counter()
+    optimized_code = extension(code, context)
+    time = conversion_time + perf_counter() - start
+
+    after = _Snapshot.of(optimized_code)
+
+    return (
+        optimized_code,
+        PassReport(
+            getattr(extension, "__name__", repr(extension)),
+            time,
+            before.instructions,
+            after.instructions,
+            _jumps_relocated(
+                before, after, isinstance(code, Bytecode) and optimized_code is code
+            ),
+            after.consts - before.consts,
+            before.globals - after.globals,
+        ),
+    )
@@ -0,0 +1,77 @@
+from inspect import CO_ASYNC_GENERATOR
+from inspect import CO_COROUTINE
+from inspect import CO_GENERATOR
+from threading import Lock
+from types import CodeType
+from typing import Callable
+
+from .bytecode import Bytecode
+from .containers import Context
+from .extension.constantize_globals import EXTENSION as constantize_globals
+from .namespace import clone_function
+from .util import with_freevars
+
+__all__ = ["Trampoline"]
+
+TRAMPOLINE_NAME = "__nibbler_trampoline__"
+
+
+def _trampoline(*args, **kwargs):
+    return __nibbler_trampoline__(*args, **kwargs)  # noqa: F821
+
+
+def _generator_trampoline(*args, **kwargs):
+    return (yield from __nibbler_trampoline__(*args, **kwargs))  # noqa: F821
+
+
+async def _coroutine_trampoline(*args, **kwargs):
+    return await __nibbler_trampoline__(*args, **kwargs)  # noqa: F821
+
+
+def _template(code: CodeType) -> CodeType:
+    # Trampolines are of the same kind as the function they stand in for
+    # (inspect.iscoroutinefunction, ...). Async generators can't be forwarded
+    # to (asend, athrow), calls still return one.
+    if code.co_flags & CO_ASYNC_GENERATOR:
+        return _trampoline.__code__
+    if code.co_flags & CO_COROUTINE:
+        return _coroutine_trampoline.__code__
+    if code.co_flags & CO_GENERATOR:
+        return _generator_trampoline.__code__
+    return _trampoline.__code__
+
+
+class Trampoline:
+    """Stands in for the code of a function until it's first called.
+
+    The first call optimizes the original code, swaps it into the function
+    and forwards the call. Subsequent calls don't pass through here anymore.
+    """
+
+    def __init__(self, callable_: Callable, optimize: Callable[[], CodeType]):
+        self._optimize = optimize
+        self._lock = Lock()
+
+        # Trampoline code calls back into this instance, which is promoted
+        # to a constant (function code can't reference its function otherwise).
+        # It shares the free variables of the original code, so the function
+        # keeps its closure once the code is swapped.
+        self._code: CodeType = constantize_globals(
+            Bytecode.from_code(
+                with_freevars(
+                    _template(callable_.__code__), callable_.__code__.co_freevars
+                )
+            ),
+            Context({}, {TRAMPOLINE_NAME: self}),
+        ).to_code()
+
+        self.function = clone_function(callable_, self._code)
+
+    def __call__(self, *args, **kwargs):
+        # Threads that made the first call at the same time wait for the code
+        # to be swapped in and optimization only happens once
+        with self._lock:
+            if self.function.__code__ is self._code:
+                self.function.__code__ = self._optimize()
+
+        return self.function(*args, **kwargs)
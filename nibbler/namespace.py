@@ -0,0 +1,140 @@
+import builtins
+from functools import lru_cache
+from itertools import chain
+from types import CodeType
+from types import FunctionType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import Mapping
+from typing import Set
+
+__all__ = [
+    "builtin_functions",
+    "BuiltinFunctions",
+    "clone_function",
+    "module_classes",
+    "module_functions",
+    "registered_name",
+]
+
+
+@lru_cache(maxsize=None)
+def builtin_functions() -> Dict[str, Callable]:
+    # Resolved once per interpreter and shared by every Nibbler (mustn't be
+    # modified)
+    return {
+        name: func
+        for name, func in (
+            (name, getattr(builtins, name))
+            for name in dir(builtins)
+            if not name.startswith("_") and name[0].lower() == name[0]
+        )
+        if callable(func)
+    }
+
+
+class BuiltinFunctions(Mapping):
+    """Builtin functions that aren't shadowed by module level definitions.
+
+    Names are only looked up when code references them, which keeps creating
+    contexts independent of the number of builtins.
+    """
+
+    def __init__(self, namespace: Dict[str, Any]):
+        functions = builtin_functions()
+        # Names (not values) are kept, which keeps the mapping picklable
+        self._shadowed = frozenset(
+            name
+            for name in namespace.keys() & functions.keys()
+            if namespace[name] is not functions[name]
+        )
+
+    def __getitem__(self, name: str) -> Callable:
+        if name in self._shadowed:
+            raise KeyError(name)
+        return builtin_functions()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in builtin_functions() if name not in self._shadowed)
+
+    def __len__(self) -> int:
+        return len(builtin_functions().keys() - self._shadowed)
+
+
+def module_classes(namespace: Dict[str, Any], module_name: str) -> Iterator[type]:
+    # Classes defined in the module (and the classes nested within them)
+    seen: Set[int] = set()
+    classes = list(namespace.values())
+    while classes:
+        value = classes.pop()
+        if (
+            not isinstance(value, type)
+            or value.__module__ != module_name
+            or id(value) in seen
+        ):
+            continue
+        seen.add(id(value))
+
+        yield value
+        classes += vars(value).values()
+
+
+def module_functions(
+    namespace: Dict[str, Any], module_name: str
+) -> Iterator[FunctionType]:
+    seen: Set[int] = set()
+
+    def candidates(values) -> Iterator[Any]:
+        for value in values:
+            # Methods are wrapped in descriptors
+            if isinstance(value, (staticmethod, classmethod)):
+                value = value.__func__
+            if isinstance(value, property):
+                yield from (value.fget, value.fset, value.fdel)
+            else:
+                yield value
+
+    for values in chain(
+        [namespace.values()],
+        (vars(cls).values() for cls in module_classes(namespace, module_name)),
+    ):
+        for value in candidates(values):
+            # Wrappers copy __module__ from the function they wrap, but are
+            # defined (and resolve globals) elsewhere
+            if (
+                isinstance(value, FunctionType)
+                and value.__globals__ is namespace
+                and id(value) not in seen
+            ):
+                seen.add(id(value))
+                yield value
+
+
+def registered_name(callable_: Callable) -> str:
+    # Methods are registered by qualified name (Class.method), functions (even
+    # ones defined within other functions) by name
+    *scope, _ = callable_.__qualname__.split(".")
+    return (
+        callable_.__qualname__
+        if scope and scope[-1] != "<locals>"
+        else callable_.__name__
+    )
+
+
+def clone_function(callable_: FunctionType, code: CodeType) -> FunctionType:
+    function = FunctionType(
+        code,
+        callable_.__globals__,
+        callable_.__name__,
+        callable_.__defaults__,
+        callable_.__closure__,
+    )
+    function.__kwdefaults__ = callable_.__kwdefaults__
+    function.__qualname__ = callable_.__qualname__
+    function.__doc__ = callable_.__doc__
+    function.__annotations__ = callable_.__annotations__
+    function.__dict__.update(callable_.__dict__)
+
+    return function
@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from dataclasses import replace
+from marshal import dumps
+from marshal import loads
+from pickle import dumps as pickle_dumps
+from pickle import PicklingError
+from types import CodeType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .cache import dump_code
+from .cache import load_code
+from .containers import Context
+from .pipeline import optimize
+
+__all__ = ["optimize_all"]
+
+# Context and config of worker processes, sent once per worker
+_worker_context: Optional[Context] = None
+_worker_config: List[Callable] = []
+
+
+def _initialize(context: Context, config: List[Callable]) -> None:
+    global _worker_context, _worker_config
+    _worker_context, _worker_config = context, config
+
+
+def _optimize_marshalled(task: Tuple[bytes, Dict[str, Any]]) -> Optional[bytes]:
+    data, changes = task
+    context = replace(_worker_context, **changes)
+
+    try:
+        optimized = optimize(loads(data), context, _worker_config, nested=True)
+    except Exception:
+        # Optimized again (and raised) in the parent process
+        return None
+
+    return dump_code(optimized, context)
+
+
+def optimize_all(
+    codes: List[CodeType],
+    contexts: List[Context],
+    config: List[Callable],
+    processes: int,
+) -> List[CodeType]:
+    if not codes:
+        return []
+
+    # Module namespaces can't be sent to other processes, passes only get to
+    # check which names exist
+    context = contexts[0]
+    portable_context = replace(
+        context, module_namespace=dict.fromkeys(context.module_namespace)
+    )
+    # Contexts of a batch only differ in function specific fields
+    tasks = [
+        {
+            field.name: getattr(function_context, field.name)
+            for field in fields(Context)
+            if field.name != "module_namespace"
+            and getattr(function_context, field.name)
+            is not getattr(context, field.name)
+        }
+        for function_context in contexts
+    ]
+    try:
+        pickle_dumps((portable_context, config, tasks))
+        data = [dumps(code) for code in codes]
+    except (PicklingError, TypeError, AttributeError, ValueError):
+        return [
+            optimize(code, context, config, nested=True)
+            for code, context in zip(codes, contexts)
+        ]
+
+    with ProcessPoolExecutor(
+        processes, initializer=_initialize, initargs=(portable_context, config)
+    ) as pool:
+        results = list(pool.map(_optimize_marshalled, zip(data, tasks)))
+
+    # Constants that had to be substituted are resolved by the parent process
+    optimized = []
+    for code, context, result in zip(codes, contexts, results):
+        loaded = load_code(result, context) if result is not None else None
+        optimized.append(
+            loaded
+            if loaded is not None
+            else optimize(code, context, config, nested=True)
+        )
+
+    return optimized
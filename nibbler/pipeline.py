@@ -0,0 +1,105 @@
+from dataclasses import replace
+from sys import version_info
+from types import CodeType
+from typing import Callable
+from typing import List
+from typing import Optional
+from warnings import warn
+
+from .bytecode import accepts_bytecode
+from .bytecode import as_bytecode
+from .bytecode import as_code
+from .constants import SUPPORTED
+from .containers import Context
+from .guard import type_guarded_code
+from .instrumentation import FunctionReport
+from .instrumentation import instrumented
+from .util import with_consts
+
+__all__ = ["optimize", "unsupported"]
+
+
+def unsupported() -> bool:
+    if SUPPORTED:
+        return False
+
+    warn(
+        f"bytecode of Python {version_info.major}.{version_info.minor} isn't "
+        "supported yet, code is left unoptimized",
+        RuntimeWarning,
+        stacklevel=3,
+    )
+    return True
+
+
+def _optimize(
+    code: CodeType,
+    context: Context,
+    config: List[Callable],
+    report: Optional[FunctionReport],
+    nested: bool,
+) -> CodeType:
+    optimized = code
+
+    # Code is decoded once and handed from pass to pass, it's only assembled
+    # for extensions that operate on code objects (and at the very end)
+    for extension in config:
+        convert = as_bytecode if accepts_bytecode(extension) else as_code
+
+        if report is not None:
+            optimized, pass_report = instrumented(
+                extension, optimized, convert, context
+            )
+            report.passes.append(pass_report)
+        else:
+            optimized = extension(convert(optimized), context)
+
+    optimized = as_code(optimized)
+
+    # Nested functions, lambdas, comprehensions, ... (whose first argument
+    # isn't self)
+    if nested:
+        nested_context = replace(
+            context,
+            qualname=None,
+            cache_attributes=False,
+            cached_attributes=set(),
+            parameter_types={},
+            arguments={},
+        )
+        optimized = with_consts(
+            optimized,
+            [
+                optimize(const, nested_context, config, nested=True)
+                if isinstance(const, CodeType)
+                else const
+                for const in optimized.co_consts
+            ],
+        )
+
+    return optimized
+
+
+def optimize(
+    code: CodeType,
+    context: Context,
+    config: List[Callable],
+    report: Optional[FunctionReport] = None,
+    nested: bool = False,
+) -> CodeType:
+    if unsupported():
+        return code
+    if not context.parameter_types:
+        return _optimize(code, context, config, report, nested)
+
+    # Calls whose arguments aren't of the types the code was specialized on
+    # run the generic code, which is only worth it if the passes made use of
+    # the types
+    generic = _optimize(
+        code, replace(context, parameter_types={}), config, None, nested
+    )
+    specialized = _optimize(code, context, config, report, nested)
+    if specialized.co_code == generic.co_code:
+        return generic
+
+    return type_guarded_code(generic, specialized, context.parameter_types)
@@ -0,0 +1,156 @@
+import sys
+from dataclasses import replace
+from importlib import import_module
+from importlib.util import cache_from_source
+from importlib.util import find_spec
+from importlib.util import MAGIC_NUMBER
+from importlib.util import module_from_spec
+from marshal import dumps
+from os import getpid
+from os import makedirs
+from os import replace as replace_file
+from os.path import dirname
+from pkgutil import walk_packages
+from types import CodeType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from warnings import warn
+
+from . import Nibbler
+from .config import DEFAULT_CONFIG
+from .namespace import module_functions
+from .util import with_consts
+
+__all__ = ["precompile_module", "precompile_packages"]
+
+
+def _marshallable(value: Any) -> bool:
+    try:
+        dumps(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _replace_codes(code: CodeType, optimized: Dict[CodeType, CodeType]) -> CodeType:
+    # Code objects of functions (and of methods within class bodies) are
+    # swapped for their optimized counterparts
+    return with_consts(
+        code,
+        [
+            (
+                optimized[const]
+                if const in optimized
+                else _replace_codes(const, optimized)
+            )
+            if isinstance(const, CodeType)
+            else const
+            for const in code.co_consts
+        ],
+    )
+
+
+def _pyc(code: CodeType, mtime: float, size: int) -> bytes:
+    # Timestamp based .pyc (PEP 552), checked against the source like any
+    # other .pyc
+    return b"".join(
+        (
+            MAGIC_NUMBER,
+            (0).to_bytes(4, "little"),
+            (int(mtime) & 0xFFFFFFFF).to_bytes(4, "little"),
+            (size & 0xFFFFFFFF).to_bytes(4, "little"),
+            dumps(code),
+        )
+    )
+
+
+def precompile_module(
+    name: str,
+    config: List[Callable] = DEFAULT_CONFIG,
+    values: Optional[Dict[str, Any]] = None,
+) -> Optional[str]:
+    # Constants are only known once the module has been executed, the module
+    # is executed from source (an earlier optimized .pyc would be picked up
+    # otherwise), which keeps its code objects identical to the ones the
+    # functions of the module were created from
+    spec = find_spec(name)
+    if (
+        spec is None
+        or spec.origin is None
+        or not spec.origin.endswith(".py")
+        or not hasattr(spec.loader, "path_stats")
+    ):
+        return None
+
+    code = spec.loader.source_to_code(spec.loader.get_data(spec.origin), spec.origin)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    exec(code, vars(module))
+
+    nibbler = Nibbler(vars(module), config=config)
+    # Values of constants that differ at build time (e.g. DEBUG)
+    nibbler.override_constants(values or {})
+
+    # Without the optimizer, constants have to be embedded in the .pyc (builtins,
+    # modules and functions are looked up at runtime as usual)
+    context = nibbler.context
+    context = replace(
+        context,
+        constants={
+            constant: value
+            for constant, value in context.constants.items()
+            if _marshallable(value)
+        },
+    )
+
+    optimized: Dict[CodeType, CodeType] = {}
+    for function in module_functions(vars(module), name):
+        try:
+            function_code = nibbler.nibble_code(function, context)
+            dumps(function_code)
+        except Exception as error:
+            warn(
+                f"could not precompile '{name}.{function.__qualname__}' ({error})",
+                RuntimeWarning,
+            )
+            continue
+        optimized[function.__code__] = function_code
+
+    stats = spec.loader.path_stats(spec.origin)
+    path = cache_from_source(spec.origin)
+    # Written atomically, like regular .pyc files
+    tmp_path = f"{path}.{getpid()}"
+    makedirs(dirname(path), exist_ok=True)
+    with open(tmp_path, "wb") as file:
+        file.write(_pyc(_replace_codes(code, optimized), stats["mtime"], stats["size"]))
+    replace_file(tmp_path, path)
+
+    return path
+
+
+def precompile_packages(
+    packages: List[str],
+    config: List[Callable] = DEFAULT_CONFIG,
+    values: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[str]:
+    # Packages (and their subpackages) or plain modules, values map qualified
+    # module names to the values of their constants
+    values = values or {}
+
+    names: List[str] = []
+    for package in packages:
+        names.append(package)
+        path = getattr(import_module(package), "__path__", None)
+        if path is not None:
+            names += [module.name for module in walk_packages(path, f"{package}.")]
+
+    return [
+        path
+        for path in (
+            precompile_module(name, config, values.get(name)) for name in names
+        )
+        if path is not None
+    ]
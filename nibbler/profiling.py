@@ -0,0 +1,160 @@
+from dataclasses import asdict
+from dataclasses import dataclass
+from json import dump
+from json import load
+from sys import getprofile
+from sys import setprofile
+from time import perf_counter
+from types import CodeType
+from types import FrameType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Tuple
+from warnings import warn
+
+from .constants import STEP
+
+__all__ = [
+    "FunctionProfile",
+    "HotFunction",
+    "Profiler",
+    "dump_profile",
+    "estimated_savings",
+    "hottest",
+    "load_profile",
+]
+
+
+@dataclass
+class FunctionProfile:
+    calls: int = 0
+    # Wall time in seconds (including the functions it calls)
+    time: float = 0.0
+    # Wall time in seconds spent in the function itself (excluding profiled
+    # functions it calls)
+    self_time: float = 0.0
+
+
+@dataclass
+class HotFunction:
+    function: str
+    calls: int
+    time: float
+    self_time: float
+    instructions_before: int
+    instructions_after: int
+    # Time spent in the function itself, scaled by the share of instructions
+    # the passes removed (a rough estimate)
+    estimated_savings: float
+
+
+class Profiler:
+    # Counts calls of (and time spent in) the given code objects on the thread
+    # profiling was started on
+    def __init__(
+        self,
+        codes: Dict[CodeType, str],
+        threshold: Optional[int] = None,
+        on_threshold: Optional[Callable[[], None]] = None,
+    ):
+        self.profile: Dict[str, FunctionProfile] = {}
+        self._codes: Dict[CodeType, str] = codes
+        self._threshold: Optional[int] = threshold
+        self._on_threshold: Optional[Callable[[], None]] = on_threshold
+        self._calls: int = 0
+        # Frames of profiled functions that are running, with the time they
+        # were entered at and the time spent in profiled functions they called
+        self._stack: List[Tuple[FrameType, float, float]] = []
+        self._previous: Optional[Callable] = None
+        self.running: bool = False
+
+    def _event(self, frame: FrameType, event: str, arg: Any) -> None:
+        if event == "call":
+            name = self._codes.get(frame.f_code)
+            if name is None:
+                return
+
+            function = self.profile.setdefault(name, FunctionProfile())
+            self._stack.append((frame, perf_counter(), 0.0))
+            # Generators and coroutines are "called" whenever they are resumed
+            if frame.f_lasti < 0:
+                function.calls += 1
+                self._calls += 1
+                if self._threshold is not None and self._calls >= self._threshold:
+                    self.stop()
+                    if self._on_threshold is not None:
+                        # Errors would otherwise surface in the profiled code
+                        try:
+                            self._on_threshold()
+                        except Exception as error:
+                            warn(
+                                f"could not nibble hot functions ({error})",
+                                RuntimeWarning,
+                            )
+        elif event == "return" and self._stack and self._stack[-1][0] is frame:
+            _, started, called = self._stack.pop()
+            elapsed = perf_counter() - started
+            function = self.profile[self._codes[frame.f_code]]
+            function.time += elapsed
+            function.self_time += elapsed - called
+            # Time the caller spent in this function isn't its own
+            if self._stack:
+                caller, caller_started, caller_called = self._stack[-1]
+                self._stack[-1] = (caller, caller_started, caller_called + elapsed)
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self._previous = getprofile()
+        setprofile(self._event)
+        self.running = True
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+
+        setprofile(self._previous)
+        self._stack.clear()
+        self.running = False
+
+
+def dump_profile(profile: Dict[str, FunctionProfile], file: TextIO) -> None:
+    dump({name: asdict(function) for name, function in profile.items()}, file, indent=2)
+
+
+def load_profile(file: TextIO) -> Dict[str, FunctionProfile]:
+    return {name: FunctionProfile(**function) for name, function in load(file).items()}
+
+
+def hottest(profile: Dict[str, FunctionProfile], count: int) -> List[str]:
+    # Functions the most time was spent in themselves (callers of hot
+    # functions aren't hot on their own, calls break ties)
+    return sorted(
+        profile,
+        key=lambda name: (profile[name].self_time, profile[name].calls),
+        reverse=True,
+    )[:count]
+
+
+def estimated_savings(
+    name: str, function: FunctionProfile, before: CodeType, after: CodeType
+) -> HotFunction:
+    instructions_before = len(before.co_code) // STEP
+    instructions_after = len(after.co_code) // STEP
+
+    return HotFunction(
+        name,
+        function.calls,
+        function.time,
+        function.self_time,
+        instructions_before,
+        instructions_after,
+        max(0.0, function.self_time * (1 - instructions_after / instructions_before))
+        if instructions_before
+        else 0.0,
+    )
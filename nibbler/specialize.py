@@ -0,0 +1,145 @@
+from functools import update_wrapper
+from inspect import CO_VARARGS
+from inspect import CO_VARKEYWORDS
+from threading import Lock
+from types import CodeType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+__all__ = ["Dispatcher", "VALUE_TYPES", "specializable"]
+
+# Values of these types are only equal to values of the same type they can't
+# be told apart from (unlike floats, 0.0 == -0.0), so a clone nibbled for one
+# is valid for all of them
+VALUE_TYPES = frozenset((bool, bytes, int, str, type(None)))
+
+DISPATCH_TEMPLATE = """
+def dispatch({parameters}):
+    __types = {types}
+    __clone = __generic.get(__types)
+    if __clone is None:
+        try:
+            __clone = __clones[__types, {values}]
+        except (KeyError, TypeError):
+            __clone = __miss(__types, {values})
+    return __clone({arguments})
+"""
+
+
+def specializable(value: Any) -> bool:
+    # Objects that don't override __eq__ are only equal to themselves
+    return type(value) in VALUE_TYPES or (
+        type(value).__eq__ is object.__eq__ and type(value).__hash__ is not None
+    )
+
+
+def _signature(code: CodeType) -> Tuple[List[str], List[str]]:
+    # Parameters of the code and the arguments that pass them on unchanged
+    # (defaults are copied from the function)
+    positional = list(code.co_varnames[: code.co_argcount])
+    keyword_only = list(
+        code.co_varnames[code.co_argcount : code.co_argcount + code.co_kwonlyargcount]
+    )
+    index = code.co_argcount + code.co_kwonlyargcount
+    varargs = code.co_varnames[index] if code.co_flags & CO_VARARGS else None
+    index += bool(varargs)
+    varkeywords = code.co_varnames[index] if code.co_flags & CO_VARKEYWORDS else None
+
+    parameters = positional.copy()
+    # Positional-only parameters (3.8+)
+    if getattr(code, "co_posonlyargcount", 0):
+        parameters.insert(code.co_posonlyargcount, "/")
+    if varargs:
+        parameters.append(f"*{varargs}")
+    elif keyword_only:
+        parameters.append("*")
+    parameters += keyword_only
+    if varkeywords:
+        parameters.append(f"**{varkeywords}")
+
+    arguments = positional + ([f"*{varargs}"] if varargs else [])
+    arguments += [f"{name}={name}" for name in keyword_only]
+    arguments += [f"**{varkeywords}"] if varkeywords else []
+
+    return parameters, arguments
+
+
+class Dispatcher:
+    """Dispatches calls to clones created for the values of some arguments.
+
+    The dispatching function has the signature of the function it stands in
+    for. It looks the clone up in a dict keyed on the types and values of the
+    arguments, values that weren't seen before go through miss(). Arguments
+    of types that can't be specialized on run a clone created without any
+    constant arguments, which is looked up by the types alone.
+    """
+
+    def __init__(
+        self,
+        callable_: Callable,
+        names: List[str],
+        create: Callable[[Dict[str, Any]], Callable],
+        maxsize: int,
+    ):
+        self._names = names
+        self._create = create
+        self._maxsize = maxsize
+        self._lock = Lock()
+        self._generic: Optional[Callable] = None
+        self.clones: Dict[Tuple[Any, ...], Callable] = {}
+        # Types of arguments that can't be specialized on
+        self.generic: Dict[Tuple[type, ...], Callable] = {}
+
+        parameters, arguments = _signature(callable_.__code__)
+        # Equal values of different types (1, True) get clones of their own
+        source = DISPATCH_TEMPLATE.format(
+            parameters=", ".join(parameters),
+            types="".join(f"__type({name}), " for name in names),
+            values=", ".join(names),
+            arguments=", ".join(arguments),
+        )
+        namespace = {
+            "__clones": self.clones,
+            "__generic": self.generic,
+            "__miss": self.miss,
+            "__type": type,
+        }
+        exec(compile(source, f"<dispatch {callable_.__qualname__}>", "exec"), namespace)
+
+        self.function = update_wrapper(namespace["dispatch"], callable_)
+        self.function.__defaults__ = callable_.__defaults__
+        self.function.__kwdefaults__ = callable_.__kwdefaults__
+        self.function.clones = self.clones
+        self.function.cache_clear = self.cache_clear
+
+    def miss(self, types: Tuple[type, ...], *values: Any) -> Callable:
+        # Threads that miss at the same time create each clone only once
+        with self._lock:
+            if not all(specializable(value) for value in values):
+                if self._generic is None:
+                    self._generic = self._create({})
+                self.generic[types] = self._generic
+                return self._generic
+
+            key = (types, *values)
+            if key in self.clones:
+                return self.clones[key]
+
+            # First in, first out: the oldest clone makes room (hits don't
+            # reorder the clones, which keeps them cheap)
+            if len(self.clones) >= self._maxsize:
+                del self.clones[next(iter(self.clones))]
+            clone = self._create(dict(zip(self._names, values)))
+            self.clones[key] = clone
+
+            return clone
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self.clones.clear()
+            self.generic.clear()
+            self._generic = None
@@ -0,0 +1,49 @@
+import math
+from dis import get_instructions
+from types import ModuleType
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.cache import dump_code
+from nibbler.cache import load_code
+
+
+class Settings:
+    BATCH_SIZE = 32
+
+    def scaled(self, number):
+        return number * 2
+
+
+math: Constant[ModuleType]
+settings: Constant[Settings] = Settings()
+
+nibbler = Nibbler(globals())
+
+
+@nibbler.nibble
+def compute(number):
+    return math.sqrt(number) + settings.BATCH_SIZE * 2 + settings.scaled(number)
+
+
+@nibbler.nibble
+def resize(number):
+    settings.BATCH_SIZE = number
+    return settings.BATCH_SIZE
+
+
+def test_attribute_chains() -> None:
+    assert compute(4) == 2 + 64 + 8
+
+    opnames = [instruction.opname for instruction in get_instructions(compute)]
+    assert "LOAD_ATTR" not in opnames and "LOAD_METHOD" not in opnames
+    assert math.sqrt in compute.__code__.co_consts
+    # Folded by fold_constants
+    assert 64 in compute.__code__.co_consts
+
+    # Assigned attributes aren't resolved
+    assert resize(16) == 16
+
+    # Resolved attributes are cached by name
+    loaded = load_code(dump_code(compute.__code__, nibbler.context), nibbler.context)
+    assert math.sqrt in loaded.co_consts
@@ -0,0 +1,66 @@
+import sys
+from types import ModuleType
+
+from nibbler import Constant
+from nibbler import Nibbler
+
+SCALE: Constant[int] = 3
+
+MODULE = """
+from nibbler import Constant
+
+OFFSET: Constant[int] = 2
+
+
+def offset(numbers):
+    return [number + OFFSET for number in numbers]
+
+
+class Offset:
+    @property
+    def numbers(self):
+        return list(map(lambda number: number + OFFSET, range(3)))
+"""
+
+
+def scaled(numbers):
+    return [number * SCALE for number in numbers]
+
+
+def counted(numbers):
+    return len(numbers)
+
+
+def test_nibble_all() -> None:
+    nibbler = Nibbler(globals())
+
+    for processes in (None, 2):
+        nibbled_scaled, nibbled_counted = nibbler.nibble_all(
+            [scaled, counted], processes=processes
+        )
+
+        assert nibbled_scaled([1, 2]) == [3, 6]
+        assert nibbled_counted([1, 2]) == 2
+        assert len in nibbled_counted.__code__.co_consts
+        # Nested code objects (the list comprehension) are optimized as well
+        assert (
+            3
+            in next(
+                const
+                for const in nibbled_scaled.__code__.co_consts
+                if hasattr(const, "co_consts")
+            ).co_consts
+        )
+
+
+def test_nibble_module(monkeypatch) -> None:
+    module = ModuleType("bulk_module")
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    exec(MODULE, vars(module))
+
+    Nibbler(vars(module)).nibble_module()
+
+    assert module.offset([1]) == [3]
+    assert 2 in module.offset.__code__.co_consts[1].co_consts
+    assert module.Offset().numbers == [2, 3, 4]
+    assert list in module.Offset.numbers.fget.__code__.co_consts
@@ -0,0 +1,50 @@
+from nibbler.bytecode import Bytecode
+from nibbler.bytecode import Instruction
+from nibbler.bytecode import Label
+from nibbler.constants import JUMP_ABS_INSTRUCTIONS
+from nibbler.constants import LOAD_CONST
+from nibbler.constants import POP_TOP
+
+
+def foo(numbers):
+    total = 0
+    for number in numbers:
+        try:
+            total += 1 / number
+        except ZeroDivisionError:
+            continue
+        if total > 10:
+            break
+    return total
+
+
+def test_round_trip() -> None:
+    code = Bytecode.from_code(foo.__code__).to_code()
+
+    assert code.co_code == foo.__code__.co_code
+    assert code.co_lnotab == foo.__code__.co_lnotab
+    assert code.co_stacksize == foo.__code__.co_stacksize
+
+
+def test_extended_jump() -> None:
+    bytecode = Bytecode.from_code(foo.__code__)
+
+    position, jump = next(
+        (position, instruction)
+        for position, instruction in enumerate(bytecode.instructions)
+        if isinstance(instruction, Instruction)
+        and instruction.op in JUMP_ABS_INSTRUCTIONS
+        and instruction.arg in bytecode.instructions[position:]
+    )
+    assert isinstance(jump.arg, Label)
+
+    # Push jump targets past 255 bytes
+    bytecode.instructions[position + 1 : position + 1] = [
+        Instruction(LOAD_CONST, 0),
+        Instruction(POP_TOP),
+    ] * 128
+
+    code = bytecode.to_code()
+
+    assert len(code.co_code) > len(foo.__code__.co_code) + 512
+    assert type(foo)(code, globals())([1, 2, 0, 4]) == foo([1, 2, 0, 4])
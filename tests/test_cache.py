@@ -0,0 +1,47 @@
+import sys
+from types import CodeType
+
+import nibbler.cache
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.containers import Context
+from nibbler.extension.constantize_globals import EXTENSION as constantize_globals
+
+LIMIT: Constant[int] = 3
+
+calls = []
+
+
+def count(code: CodeType, context: Context) -> CodeType:
+    calls.append(code.co_name)
+
+    return code
+
+
+def limited(numbers):
+    return print(min(len(numbers), LIMIT))
+
+
+def test_cache(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(nibbler.cache, "CACHE_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+
+    cold = Nibbler(globals(), config=[constantize_globals, count], cache=True)
+    cold_limited = cold.nibble(limited)
+
+    assert calls == ["limited"]
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Fresh instance (e.g. another worker process) reuses the optimized code
+    warm = Nibbler(globals(), config=[constantize_globals, count], cache=True)
+    warm_limited = warm.nibble(limited)
+
+    assert calls == ["limited"]
+    assert warm_limited.__code__ == cold_limited.__code__
+    assert print in warm_limited.__code__.co_consts
+
+    # Changed constants invalidate the cached code
+    monkeypatch.setitem(globals(), "LIMIT", 4)
+    Nibbler(globals(), config=[constantize_globals, count], cache=True).nibble(limited)
+
+    assert calls == ["limited", "limited"]
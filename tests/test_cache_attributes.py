@@ -0,0 +1,50 @@
+from dis import get_instructions
+
+from nibbler import Nibbler
+
+nibbler = Nibbler(globals())
+
+
+@nibbler.nibble(cache_attributes=["buffer.append", "separator"])
+class Tokenizer:
+    def __init__(self, separator=" "):
+        # The chain doesn't exist until reset() is called
+        self.reset()
+        self.buffer.append("<start>")
+        self.separator = separator
+
+    def reset(self):
+        self.buffer = []
+
+    def feed(self, text):
+        for token in text.split(self.separator):
+            if token:
+                self.buffer.append(token)
+        return self.buffer
+
+    def split(self, texts):
+        # Rebound within the method, not hoisted
+        for text in texts:
+            self.separator = ","
+            self.buffer.append(text.split(self.separator))
+
+
+def opnames(function):
+    return [instruction.opname for instruction in get_instructions(function)]
+
+
+def test_cache_attributes() -> None:
+    tokenizer = Tokenizer()
+
+    assert tokenizer.feed("a  b") == ["<start>", "a", "b"]
+    assert tokenizer.feed("c") == ["<start>", "a", "b", "c"]
+    # self.buffer.append is looked up once before the loop, the bound method
+    # is called
+    assert "<self.buffer.append>" in Tokenizer.feed.__code__.co_varnames
+    assert opnames(Tokenizer.feed).count("LOAD_METHOD") == 1
+    # Reads outside of loops are left alone
+    assert opnames(Tokenizer.__init__).count("LOAD_METHOD") == 2
+
+    tokenizer.split(["d,e"])
+    assert tokenizer.buffer[-1] == ["d", "e"]
+    assert "<self.separator>" not in Tokenizer.split.__code__.co_varnames
@@ -0,0 +1,66 @@
+from dis import get_instructions
+
+from nibbler import Constant
+from nibbler import Nibbler
+
+STEP: Constant[int] = 2
+
+nibbler = Nibbler(globals())
+
+
+class Base:
+    def total(self):
+        return 0
+
+
+@nibbler.nibble(cache_attributes=True)
+class Counter(Base):
+    def __init__(self, numbers):
+        self.numbers = numbers
+
+    @nibbler.inline
+    def scaled(self, number):
+        return number * self.factor
+
+    def total(self, factor=1):
+        self.factor = factor
+        return sum(self.scaled(number) for number in self.numbers) + super().total()
+
+    def count(self):
+        total = 0
+        for number in self.numbers:
+            total += self.scaled(number) + len(self.numbers)
+        return total
+
+    @property
+    def first(self):
+        return self.numbers[0] * STEP
+
+    @classmethod
+    def create(cls):
+        return cls(list(range(STEP)))
+
+    @staticmethod
+    def step():
+        return STEP
+
+
+def test_class() -> None:
+    counter = Counter.create()
+
+    assert counter.numbers == [0, 1]
+    assert counter.first == 0
+    assert Counter.step() == 2
+    assert Counter([1, 2]).total(factor=3) == 9
+    assert Counter.total.__defaults__ == (1,)
+    assert Counter.total.__qualname__ == "Counter.total"
+
+    counter.factor = 3
+    assert counter.count() == (0 + 2) + (3 + 2)
+
+    # self.scaled() was inlined, self.numbers is read once
+    opnames = [instruction.opname for instruction in get_instructions(Counter.count)]
+    assert "CALL_METHOD" not in opnames
+    assert opnames.count("LOAD_ATTR") == 2
+    assert "<self.numbers>" in Counter.count.__code__.co_varnames
+    assert STEP in Counter.step.__code__.co_consts
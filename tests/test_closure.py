@@ -0,0 +1,102 @@
+from asyncio import get_event_loop
+from asyncio import sleep
+from inspect import isasyncgenfunction
+from inspect import iscoroutinefunction
+from inspect import isgeneratorfunction
+
+from nibbler import Constant
+from nibbler import Nibbler
+
+LIMIT: Constant[int] = 3
+
+nibbler = Nibbler(globals())
+
+
+@nibbler.inline
+def double(number):
+    return number * 2
+
+
+@nibbler.inline
+def limit():
+    total = min(total, LIMIT)  # noqa: F841,F821
+
+
+def offset(by):
+    @nibbler.nibble(lazy=True)
+    def add(number, scale=1, *, extra=0):
+        return double(number) * scale + by + extra
+
+    return add
+
+
+@nibbler.nibble
+def numbers(count):
+    for number in range(min(count, LIMIT)):
+        yield double(number)
+
+
+@nibbler.nibble(lazy=True)
+def lazy_numbers(count):
+    yield from range(min(count, LIMIT))
+
+
+@nibbler.nibble
+async def delayed(number):
+    await sleep(0)
+    return double(number) + LIMIT
+
+
+@nibbler.nibble(lazy=True)
+async def lazy_delayed(number):
+    await sleep(0)
+    return number + LIMIT
+
+
+@nibbler.nibble
+async def stream(count):
+    for number in range(count):
+        yield double(number)
+
+
+@nibbler.nibble
+def shared(total):
+    limit()
+    return (lambda: total + LIMIT)()
+
+
+@nibbler.nibble
+def adder(by):
+    return lambda number: number + by + LIMIT
+
+
+def test_closure() -> None:
+    add = offset(10)
+
+    assert add(1, 2, extra=1) == 15
+    assert add.__defaults__ == (1,) and add.__kwdefaults__ == {"extra": 0}
+    assert add.__closure__[0].cell_contents == 10
+    assert shared(5) == 6
+    # Nested code objects are optimized as well
+    assert adder(1)(2) == 6
+    assert LIMIT in adder(1).__code__.co_consts
+
+
+def test_generator() -> None:
+    assert list(numbers(10)) == [0, 2, 4]
+    assert isgeneratorfunction(lazy_numbers)
+    assert list(lazy_numbers(10)) == [0, 1, 2]
+    assert list(lazy_numbers(2)) == [0, 1]
+
+
+def test_coroutine() -> None:
+    async def collect():
+        return [number async for number in stream(3)]
+
+    loop = get_event_loop()
+    assert loop.run_until_complete(delayed(1)) == 5
+    assert iscoroutinefunction(lazy_delayed)
+    assert loop.run_until_complete(lazy_delayed(1)) == 4
+    assert loop.run_until_complete(lazy_delayed(2)) == 5
+    assert isasyncgenfunction(stream)
+    assert loop.run_until_complete(collect()) == [0, 2, 4]
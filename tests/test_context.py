@@ -1,8 +1,11 @@
 import builtins
 
+import pytest
+
 from nibbler import Constant
 from nibbler import Nibbler
 from nibbler.containers import Context
+from nibbler.namespace import builtin_functions
 
 FOO: Constant[str] = "bar"
 
@@ -41,3 +44,23 @@ def test_context() -> None:
         )
         == nibbler.context
     )
+
+
+def test_builtins(monkeypatch) -> None:
+    # Resolved once, not by every Nibbler
+    Nibbler(globals())
+    assert builtin_functions.cache_info().misses == 1
+
+    # Shadowing is checked when the context is created (not the Nibbler)
+    monkeypatch.setitem(globals(), "len", lambda value: 0)
+    assert "len" not in nibbler.context.constants
+    assert nibbler.context.constants["min"] is min
+
+
+def test_override_constants() -> None:
+    overridden = Nibbler(globals())
+    overridden.override_constants({"FOO": "baz"})
+
+    assert overridden.context.constants["FOO"] == "baz"
+    with pytest.raises(ValueError):
+        overridden.override_constants({"inline": None})
@@ -0,0 +1,125 @@
+from dis import get_instructions
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.bytecode import Bytecode
+from nibbler.bytecode import Instruction
+from nibbler.bytecode import Label
+from nibbler.constants import JUMP_ABSOLUTE
+from nibbler.constants import JUMP_FORWARD
+from nibbler.constants import LOAD_CONST
+from nibbler.constants import LOAD_FAST
+from nibbler.constants import POP_JUMP_IF_FALSE
+from nibbler.constants import POP_JUMP_IF_TRUE
+from nibbler.constants import RETURN_VALUE
+from nibbler.containers import Context
+from nibbler.extension.eliminate_dead_code import EXTENSION as eliminate_dead_code
+from nibbler.extension.precompute_conditionals import (
+    EXTENSION as precompute_conditionals,
+)
+
+DEBUG: Constant[bool] = False
+
+
+def logged(number):
+    message = f"number: {number}"
+    if DEBUG:
+        print(message)
+    return number
+
+
+def unused(number):
+    result = number  # noqa: F841
+    label = "number"  # noqa: F841
+    return number + 1
+
+
+def reassigned(line, count):
+    for number in range(count):
+        line = str(number)
+        last = line  # noqa: F841
+    return count
+
+
+def returned(number):
+    return number
+    print(number)
+
+
+def opnames(function):
+    return [instruction.opname for instruction in get_instructions(function)]
+
+
+def test_eliminate_dead_code() -> None:
+    nibbler = Nibbler(globals(), config=[precompute_conditionals, eliminate_dead_code])
+    nibbled_logged, nibbled_returned = (
+        nibbler.nibble(function) for function in (logged, returned)
+    )
+
+    assert nibbled_logged(3) == 3
+    # The message isn't read anymore
+    assert "STORE_FAST" not in opnames(nibbled_logged)
+
+    # Stores of unused values are removed along with their loads
+    nibbled_unused = nibbler.nibble(unused)
+    assert nibbled_unused(1) == 2
+    assert opnames(nibbled_unused) == [
+        "LOAD_FAST",
+        "LOAD_CONST",
+        "BINARY_ADD",
+        "RETURN_VALUE",
+    ]
+
+    assert nibbled_returned(1) == 1
+    assert opnames(nibbled_returned) == ["LOAD_FAST", "RETURN_VALUE"]
+
+
+def test_negative_jump() -> None:
+    bytecode = Bytecode.from_code(returned.__code__)
+    top = Label()
+    bytecode.instructions = [
+        top,
+        Instruction(LOAD_CONST, bytecode.add_const(True)),
+        Instruction(POP_JUMP_IF_TRUE, top),
+        Instruction(LOAD_CONST, bytecode.add_const(None)),
+        Instruction(RETURN_VALUE),
+    ]
+
+    eliminate_dead_code(precompute_conditionals(bytecode, Context({})), Context({}))
+
+    assert bytecode.instructions == [top, Instruction(JUMP_ABSOLUTE, top)]
+
+
+def test_jump_chain() -> None:
+    bytecode = Bytecode.from_code(returned.__code__)
+    middle, end = Label(), Label()
+    bytecode.instructions = [
+        Instruction(LOAD_FAST, 0),
+        Instruction(POP_JUMP_IF_FALSE, middle),
+        Instruction(LOAD_FAST, 0),
+        Instruction(RETURN_VALUE),
+        middle,
+        Instruction(JUMP_FORWARD, end),
+        Instruction(LOAD_FAST, 0),
+        Instruction(RETURN_VALUE),
+        end,
+        Instruction(LOAD_CONST, bytecode.add_const(None)),
+        Instruction(RETURN_VALUE),
+    ]
+
+    eliminate_dead_code(bytecode, Context({}))
+
+    # Jumps go straight to their final target, unreachable code is removed
+    assert bytecode.instructions[1] == Instruction(POP_JUMP_IF_FALSE, end)
+    assert JUMP_FORWARD not in [
+        item.op for item in bytecode.instructions if isinstance(item, Instruction)
+    ]
+    assert len(bytecode.instructions) == 8
+
+
+def test_reassigned_parameter() -> None:
+    # The load of line feeds both a store/load pair and a dead store
+    nibbled = Nibbler(globals()).nibble(reassigned)
+
+    assert nibbled("a", 3) == 3
+    assert nibbled("a", 0) == 0
@@ -0,0 +1,43 @@
+from dis import get_instructions
+from typing import Tuple
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.extension.constantize_globals import EXTENSION as constantize_globals
+from nibbler.extension.fold_constants import EXTENSION as fold_constants
+
+TIMEOUT: Constant[int] = 30
+HEADERS: Constant[Tuple[str, ...]] = ("Accept", "Host")
+
+nibbler = Nibbler(globals(), config=[constantize_globals, fold_constants])
+
+
+@nibbler.pure
+def padded(value: str, width: int = 0) -> str:
+    return value.ljust(width)
+
+
+def folded(timeout: int):
+    return TIMEOUT * 1000, len(HEADERS), HEADERS[-1], -TIMEOUT, padded("a", width=3)
+
+
+def unfolded(timeout: int):
+    return timeout * 1000, TIMEOUT // 0, list(HEADERS), print(TIMEOUT)
+
+
+def test_fold_constants() -> None:
+    code = nibbler.nibble(folded).__code__
+
+    for value in (30000, 2, "Host", -30, "a  "):
+        assert value in code.co_consts
+    assert nibbler.nibble(folded)(0) == folded(0)
+
+
+def test_fold_constants_unfolded() -> None:
+    code = nibbler.nibble(unfolded).__code__
+    opnames = [instruction.opname for instruction in get_instructions(code)]
+
+    assert 30000 not in code.co_consts
+    # Errors are raised at runtime, impure and mutable results aren't folded
+    assert "BINARY_FLOOR_DIVIDE" in opnames
+    assert opnames.count("CALL_FUNCTION") == 2
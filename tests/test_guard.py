@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import nibbler.guard
+from nibbler import Constant
+from nibbler import Nibbler
+
+LIMIT: Constant[int] = 3
+
+
+def limited(numbers):
+    return min(len(numbers), LIMIT)
+
+
+def attributes(value):
+    return value.LIMIT, value.len
+
+
+def test_guard(monkeypatch) -> None:
+    nibbled = Nibbler(globals(), guarded=True).nibble(limited)
+
+    assert nibbled(range(10)) == 3
+    assert 3 in nibbled.__code__.co_consts
+
+    # Reloaded "constant", the call falls back to the original code
+    monkeypatch.setitem(globals(), "LIMIT", 5)
+    assert nibbled(range(10)) == 5
+    assert 5 in nibbled.__code__.co_consts
+    assert nibbled(range(10)) == 5
+
+    # Builtins are guarded against shadowing
+    monkeypatch.setitem(globals(), "len", lambda numbers: 4)
+    assert nibbled(range(10)) == 4
+
+
+def test_guard_deoptimize(monkeypatch) -> None:
+    monkeypatch.setattr(nibbler.guard, "MAX_SPECIALIZATIONS", 2)
+    nibbled = Nibbler(globals(), guarded=True).nibble(limited)
+
+    for limit in range(4, 8):
+        monkeypatch.setitem(globals(), "LIMIT", limit)
+        assert nibbled(range(10)) == limit
+
+    assert nibbled.__code__ is limited.__code__
+
+
+def test_unguarded() -> None:
+    # Attribute names aren't globals, unchanged code isn't guarded
+    nibbled = Nibbler(globals(), guarded=True).nibble(attributes)
+
+    assert nibbled(SimpleNamespace(LIMIT=1, len=2)) == (1, 2)
+    assert nibbled.__code__.co_code == attributes.__code__.co_code
@@ -0,0 +1,73 @@
+from dis import get_instructions
+from typing import Optional
+from typing import TYPE_CHECKING
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler import Stable
+
+if TYPE_CHECKING:
+    from decimal import Decimal
+
+SCALE: Constant[int] = 3
+
+nibbler = Nibbler(globals())
+
+
+class Point:
+    x: Stable[int]
+    # Only resolvable while type checking
+    total: Optional["Decimal"]
+    y: "Stable[int]"
+
+    def __init__(self, x):
+        self.x = x
+
+
+@nibbler.nibble
+def collect(values, point):
+    result = []
+    scale = SCALE
+    offset = 2
+    for value in values:
+        result.append(value * (scale + offset) + point.x)
+    return result
+
+
+@nibbler.nibble
+def rebound(values):
+    result = []
+    for value in values:
+        result.append(value)
+        result = list(result)
+    return result
+
+
+def test_stable_attributes() -> None:
+    assert {"x", "y"} <= nibbler.context.stable_attributes
+    assert "total" not in nibbler.context.stable_attributes
+
+
+def test_hoist_invariants() -> None:
+    assert collect([1, 2], Point(5)) == [10, 15]
+    assert rebound([1, 2]) == [1, 2]
+
+    instructions = list(get_instructions(collect))
+    setup = next(
+        index
+        for index, instruction in enumerate(instructions)
+        if instruction.opname == "SETUP_LOOP"
+    )
+    # Method lookup, attribute lookup and arithmetic happen once
+    assert {
+        instruction.argval
+        for instruction in instructions[:setup]
+        if instruction.opname == "STORE_FAST"
+    } >= {"<result.append>", "<(scale + offset)>", "<point.x>"}
+    opnames = [instruction.opname for instruction in instructions[setup:]]
+    assert "LOAD_ATTR" not in opnames and "LOAD_METHOD" not in opnames
+    assert opnames.count("BINARY_ADD") == 1
+    # Rebound locals aren't invariant
+    assert "LOAD_METHOD" in [
+        instruction.opname for instruction in get_instructions(rebound)
+    ]
@@ -0,0 +1,80 @@
+import sys
+from dis import get_instructions
+from importlib import import_module
+from textwrap import dedent
+from types import CodeType
+
+from nibbler.hook import install_from_file
+from nibbler.hook import uninstall
+
+MODULE = """
+from nibbler import Constant
+
+SCALE: Constant[int] = 3
+
+
+def scaled(numbers):
+    return [number * SCALE for number in range(len(numbers))]
+
+
+def filter(numbers):
+    return numbers
+
+
+def filtered(numbers):
+    return filter(numbers)
+
+
+class Scaler:
+    def scale(self, number):
+        return number * SCALE
+
+    @staticmethod
+    def count(numbers):
+        return len(numbers)
+"""
+
+
+def test_hook(tmp_path, monkeypatch) -> None:
+    package = tmp_path / "hooked"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "module.py").write_text(MODULE)
+    (tmp_path / "nibbler.cfg").write_text(
+        dedent(
+            """
+            [nibbler]
+            packages = hooked
+            """
+        )
+    )
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    finder = install_from_file(str(tmp_path / "nibbler.cfg"))
+    try:
+        module = import_module("hooked.module")
+    finally:
+        uninstall(finder)
+        for name in ("hooked", "hooked.module"):
+            sys.modules.pop(name, None)
+
+    assert module.scaled([4, 5]) == [0, 3]
+    # SCALE is only referenced by the list comprehension
+    comprehension = next(
+        const
+        for const in module.scaled.__code__.co_consts
+        if isinstance(const, CodeType)
+    )
+    assert "LOAD_GLOBAL" not in [
+        instruction.opname for instruction in get_instructions(comprehension)
+    ]
+    assert 3 in comprehension.co_consts
+    assert len in module.scaled.__code__.co_consts
+
+    # Module level definitions shadow builtins
+    assert module.filtered([1]) == [1]
+    assert "filter" in module.filtered.__code__.co_names
+
+    assert module.Scaler().scale(2) == 6
+    assert 3 in module.Scaler.scale.__code__.co_consts
+    assert len in module.Scaler.count.__code__.co_consts
@@ -1,3 +1,5 @@
+from dis import get_instructions
+
 from nibbler import Nibbler
 
 nibbler = Nibbler(globals())
@@ -24,4 +26,46 @@ def test_inline() -> None:
         return a  # noqa: F821
 
     assert foo_1() == foo_2()
-    assert foo_1.__code__.co_code == foo_2.__code__.co_code
+    # Both are subject to the same passes (dead store elimination, ...)
+    assert nibbler.nibble(foo_1).__code__.co_code == foo_2.__code__.co_code
+
+
+@nibbler.inline
+def clamp(value: int, lower: int = 0, upper: int = 10) -> int:
+    if value < lower:
+        return lower
+    return min(value, upper)
+
+
+def test_inline_arguments() -> None:
+    @nibbler.nibble
+    def clamped(values):
+        value = -1
+        results = []
+        for number in values:
+            results.append(clamp(number, upper=4))
+        return results, clamp(clamp(12), 5), value
+
+    assert clamped([-3, 2, 7]) == ([0, 2, 4], 10, -1)
+    assert "CALL_FUNCTION_KW" not in [
+        instruction.opname for instruction in get_instructions(clamped)
+    ]
+    assert "clamp.value" in clamped.__code__.co_varnames
+
+
+@nibbler.inline
+def record(values: list, value: int) -> None:
+    if value < 0:
+        return
+    values.append(value)
+
+
+def test_inline_early_return() -> None:
+    @nibbler.nibble
+    def recorded(numbers):
+        values = []
+        for value in numbers:
+            record()
+        return values
+
+    assert recorded([1, -2, 3]) == [1, 3]
@@ -0,0 +1,73 @@
+from io import StringIO
+from json import load
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.extension.constantize_globals import EXTENSION as constantize_globals
+from nibbler.extension.peephole import EXTENSION as peephole
+from nibbler.extension.precompute_conditionals import (
+    EXTENSION as precompute_conditionals,
+)
+
+DEBUG: Constant[bool] = False
+
+nibbler = Nibbler(
+    globals(),
+    config=[constantize_globals, precompute_conditionals, peephole],
+    instrument=True,
+)
+
+
+@nibbler.nibble
+def foo(numbers):
+    total = 0
+    for number in numbers:
+        if DEBUG:
+            print(number)
+        total += number
+    return total
+
+
+def test_instrumentation() -> None:
+    assert foo(range(4)) == 6
+
+    (function_report,) = nibbler.report
+    assert function_report["function"] == f"{__name__}.foo"
+
+    constantize, precompute, peephole_ = function_report["passes"]
+
+    assert [constantize["name"], precompute["name"], peephole_["name"]] == [
+        "constantize_globals",
+        "precompute_conditionals",
+        "peephole",
+    ]
+    assert all(pass_report["time"] >= 0 for pass_report in function_report["passes"])
+
+    # DEBUG and print
+    assert constantize["constants_added"] == 2
+    assert constantize["globals_removed"] == 2
+    assert constantize["instructions_before"] == constantize["instructions_after"]
+
+    # LOAD_CONST, POP_JUMP_IF_FALSE, LOAD_CONST, LOAD_FAST, CALL_FUNCTION, POP_TOP
+    assert precompute["instructions_before"] - precompute["instructions_after"] == 6
+    assert precompute["jumps_relocated"] == 2
+
+    buffer = StringIO()
+    nibbler.dump_report(buffer)
+    buffer.seek(0)
+
+    assert load(buffer) == nibbler.report
+
+
+class Stack:
+    def total(self, numbers):
+        return sum(numbers)
+
+
+def test_qualname() -> None:
+    method_nibbler = Nibbler(globals(), instrument=True)
+    method_nibbler.nibble(Stack.total)
+
+    assert [report["function"] for report in method_nibbler.report] == [
+        f"{__name__}.Stack.total"
+    ]
@@ -0,0 +1,56 @@
+from threading import Barrier
+from threading import Thread
+from time import sleep
+from types import CodeType
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.containers import Context
+from nibbler.extension.constantize_globals import EXTENSION as constantize_globals
+
+OFFSET: Constant[int] = 10
+
+calls = []
+
+
+def count(code: CodeType, context: Context) -> CodeType:
+    calls.append(code.co_name)
+    # Widen the window for concurrent first calls
+    sleep(0.05)
+
+    return code
+
+
+nibbler = Nibbler(globals(), config=[constantize_globals, count], lazy=True)
+
+
+@nibbler.nibble
+def add(number):
+    return number + OFFSET
+
+
+@nibbler.nibble(lazy=False)
+def subtract(number):
+    return number - OFFSET
+
+
+def test_lazy() -> None:
+    assert calls == ["subtract"]
+
+    thread_count = 8
+    barrier = Barrier(thread_count)
+    results = []
+
+    def call() -> None:
+        barrier.wait()
+        results.append(add(thread_count))
+
+    threads = [Thread(target=call) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [18] * thread_count
+    assert calls == ["subtract", "add"]
+    assert OFFSET in add.__code__.co_consts
@@ -0,0 +1,45 @@
+from sys import exc_info
+from traceback import extract_tb
+
+from nibbler import Constant
+from nibbler import Nibbler
+
+DEBUG: Constant[bool] = False
+
+nibbler = Nibbler(globals())
+
+
+@nibbler.inline
+def divide():
+    result = number / divisor  # noqa: F841,F821
+
+
+@nibbler.nibble
+def foo(number, divisor):
+    if DEBUG:
+        print(number, divisor)
+    divide()
+    return result  # noqa: F821
+
+
+@nibbler.nibble
+def bar(values):
+    if DEBUG:
+        print(values)
+    return values[len(values)]
+
+
+def raised_at(callable_, *args):
+    try:
+        callable_(*args)
+    except Exception:
+        frame = extract_tb(exc_info()[2])[-1]
+        return frame.filename, frame.lineno
+
+
+def test_lnotab() -> None:
+    assert foo(1, 2) == 0.5
+
+    # co_firstlineno points at the decorator
+    assert raised_at(foo, 1, 0) == (__file__, divide.__code__.co_firstlineno + 2)
+    assert raised_at(bar, [1]) == (__file__, bar.__code__.co_firstlineno + 4)
@@ -0,0 +1,65 @@
+import sys
+from dis import get_instructions
+from importlib import import_module
+from importlib import invalidate_caches
+from json import dumps
+
+from nibbler.__main__ import main
+
+MODULE = """
+from nibbler import Constant
+
+DEBUG: Constant[bool] = True
+SCALE: Constant[int] = 3
+
+
+def scaled(numbers):
+    if DEBUG:
+        return "debug"
+    return [number * SCALE for number in range(len(numbers))]
+
+
+class Scaler:
+    def scale(self, number):
+        if DEBUG:
+            return "debug"
+        return number * SCALE
+"""
+
+
+def opnames(function):
+    return [instruction.opname for instruction in get_instructions(function)]
+
+
+def test_precompile(tmp_path, monkeypatch, capsys) -> None:
+    package = tmp_path / "precompiled"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "module.py").write_text(MODULE)
+    (tmp_path / "values.json").write_text(
+        dumps({"precompiled.module": {"DEBUG": False}})
+    )
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        main(["--values", str(tmp_path / "values.json"), "precompiled"])
+        written = capsys.readouterr().out.split()
+
+        # Imported from the optimized .pyc (without nibbling at runtime)
+        for name in ("precompiled", "precompiled.module"):
+            sys.modules.pop(name, None)
+        invalidate_caches()
+        module = import_module("precompiled.module")
+    finally:
+        for name in ("precompiled", "precompiled.module"):
+            sys.modules.pop(name, None)
+
+    assert len(written) == 2
+    assert module.__cached__ in written
+    assert module.DEBUG is True
+    assert module.scaled([4, 5]) == [0, 3]
+    assert module.Scaler().scale(2) == 6
+    # DEBUG and SCALE were embedded, builtins are still looked up
+    assert "POP_JUMP_IF_FALSE" not in opnames(module.scaled)
+    assert "LOAD_GLOBAL" not in opnames(module.Scaler.scale)
+    assert "LOAD_GLOBAL" in opnames(module.scaled)
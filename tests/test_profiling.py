@@ -0,0 +1,125 @@
+from io import StringIO
+from sys import getprofile
+
+import pytest
+
+from nibbler import Constant
+from nibbler import Nibbler
+
+DEBUG: Constant[bool] = False
+
+nibbler = Nibbler(globals())
+
+
+def hot(value):
+    if DEBUG:
+        print(value)
+    return value * 2
+
+
+def cold(value):
+    if DEBUG:
+        print(value)
+    return value
+
+
+def numbers(count):
+    for number in range(count):
+        yield hot(number)
+
+
+def work(count):
+    if DEBUG:
+        print(count)
+    return sum(range(count))
+
+
+def caller(count):
+    # Spends most of its time in work (which is profiled)
+    return work(count)
+
+
+def test_profiling() -> None:
+    hot_code, cold_code = hot.__code__, cold.__code__
+    profile = getprofile()
+
+    nibbler.start_profiling()
+    for value in range(50):
+        hot(value)
+    cold(0)
+    assert list(numbers(3)) == [0, 2, 4]
+    nibbler.stop_profiling()
+
+    assert getprofile() is profile
+    assert nibbler.profile["hot"]["calls"] == 53
+    assert nibbler.profile["cold"]["calls"] == 1
+    # Resuming a generator doesn't count as a call
+    assert nibbler.profile["numbers"]["calls"] == 1
+
+    file = StringIO()
+    nibbler.dump_profile(file)
+    file.seek(0)
+
+    # Profiles of earlier runs can be loaded
+    hot_functions = Nibbler(globals()).nibble_hot(1, file)
+    assert [hot_function["function"] for hot_function in hot_functions] == ["hot"]
+    assert (
+        hot_functions[0]["instructions_after"] < hot_functions[0]["instructions_before"]
+    )
+    assert hot.__code__ is not hot_code
+    assert cold.__code__ is cold_code
+    assert hot(2) == 4
+
+    hot.__code__ = hot_code
+
+
+def test_threshold() -> None:
+    threshold_nibbler = Nibbler(globals())
+    hot_code = hot.__code__
+    profile = getprofile()
+
+    threshold_nibbler.start_profiling(threshold=10, count=1)
+    for value in range(10):
+        assert hot(value) == value * 2
+
+    # Profiling stops once the threshold was reached
+    assert getprofile() is profile
+    assert hot.__code__ is not hot_code
+    assert threshold_nibbler.hot_report[0]["function"] == "hot"
+    assert threshold_nibbler.hot_report[0]["calls"] == 10
+
+    hot.__code__ = hot_code
+
+
+def test_self_time() -> None:
+    work_code, caller_code = work.__code__, caller.__code__
+    self_nibbler = Nibbler(globals())
+
+    self_nibbler.start_profiling()
+    for _ in range(5):
+        caller(100000)
+    self_nibbler.stop_profiling()
+
+    profile = self_nibbler.profile["caller"]
+    assert profile["self_time"] < profile["time"] / 2
+    # Callers rank by the time spent in themselves
+    hot_functions = self_nibbler.nibble_hot(1)
+    assert [hot_function["function"] for hot_function in hot_functions] == ["work"]
+    assert caller.__code__ is caller_code
+
+    work.__code__ = work_code
+
+
+def test_threshold_error(monkeypatch) -> None:
+    threshold_nibbler = Nibbler(globals())
+    profile = getprofile()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(threshold_nibbler, "nibble_hot", fail)
+    threshold_nibbler.start_profiling(threshold=1)
+    # The error is reported instead of surfacing in the profiled call
+    with pytest.warns(RuntimeWarning):
+        assert hot(1) == 2
+    assert getprofile() is profile
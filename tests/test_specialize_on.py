@@ -0,0 +1,96 @@
+from dataclasses import replace
+from dis import get_instructions
+
+import pytest
+
+from nibbler import Nibbler
+
+nibbler = Nibbler(globals())
+
+
+class Format:
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Format) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+@nibbler.specialize_on("fmt", "indent")
+def encode(record, fmt="json", *, indent=0):
+    if fmt == "json":
+        return "{" + " " * indent + ", ".join(record) + "}"
+    elif fmt == "csv":
+        return ",".join(record)
+    return fmt
+
+
+@nibbler.specialize_on("fmt")
+def decode(text, fmt):
+    fmt = fmt.lower()
+    if fmt == "csv":
+        return text.split(",")
+    return [text]
+
+
+@nibbler.specialize_on("flag", maxsize=1)
+def flagged(flag):
+    return repr(flag)
+
+
+def test_specialize_on() -> None:
+    assert encode(["a", "b"]) == "{a, b}"
+    assert encode(["a", "b"], "csv") == "a,b"
+    assert encode(["a", "b"], fmt="csv") == "a,b"
+    assert encode(["a"], indent=1) == "{ a}"
+    assert encode(["a"], ["unhashable"]) == ["unhashable"]
+    assert encode.__name__ == "encode"
+    # ("json", 0), ("csv", 0) and ("json", 1)
+    assert len(encode.clones) == 3
+
+    # Comparisons of the constant argument were folded and stripped out
+    code = nibbler.nibble_code(
+        encode.__wrapped__,
+        replace(nibbler.context, arguments={"fmt": "csv", "indent": 0}),
+    )
+    assert "COMPARE_OP" not in [
+        instruction.opname for instruction in get_instructions(code)
+    ]
+
+    with pytest.raises(TypeError):
+        encode()
+
+
+def test_values() -> None:
+    # Objects that compare equal to others run a clone without constant
+    # arguments (as do floats, 0.0 == -0.0)
+    first, second = Format("xml"), Format("xml")
+    assert encode(["a"], first) is first
+    assert encode(["a"], second) is second
+    assert flagged(0.0) == "0.0"
+    assert flagged(-0.0) == "-0.0"
+    assert len(encode.clones) == 3
+
+    # Equal values of different types get clones of their own
+    assert flagged(1) == "1"
+    assert flagged(True) == "True"
+    assert flagged(1) == "1"
+    assert len(flagged.clones) == 1
+
+    flagged.cache_clear()
+    assert not flagged.clones
+    assert flagged(None) == "None"
+
+
+def test_reassigned() -> None:
+    # Arguments that are assigned within the function aren't dispatched on
+    assert decode("a,b", "CSV") == ["a", "b"]
+    assert not hasattr(decode, "clones")
+
+
+def test_invalid() -> None:
+    with pytest.raises(ValueError):
+        nibbler.specialize_on("missing")(encode.__wrapped__)
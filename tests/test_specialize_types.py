@@ -0,0 +1,62 @@
+from dis import get_instructions
+from typing import List
+
+from nibbler import Nibbler
+
+nibbler = Nibbler(globals(), specialize_types=True)
+
+
+class Number(int):
+    pass
+
+
+def scale(values: List[int], factor: int, offset: int) -> List[int]:
+    result = []
+    for value in values:
+        result.append(value * (factor + offset))
+    return result
+
+
+def shifted(values: list, scale: float, offset: int) -> list:
+    result = []
+    for value in values:
+        result.append(value * (scale + offset))
+    return result
+
+
+def untyped(values, factor):
+    return [value * factor for value in values]
+
+
+def opnames(function):
+    return [instruction.opname for instruction in get_instructions(function)]
+
+
+def test_specialize_types() -> None:
+    nibbled = nibbler.nibble(scale)
+
+    assert nibbled([1, 2], 2, 1) == [3, 6]
+    # factor + offset was hoisted out of the specialized loop
+    assert any(name.startswith("<(factor") for name in nibbled.__code__.co_varnames)
+    assert int in nibbled.__code__.co_consts
+
+    # Arguments of other types run the generic code
+    assert nibbled([1, 2], 2.5, 1) == [3.5, 7.0]
+    assert nibbled([1, 2], Number(2), 1) == [3, 6]
+    assert nibbled((1, 2), 2, 1) == [3, 6]
+
+
+def test_unspecialized() -> None:
+    # Code without type specific optimizations isn't guarded
+    nibbled = nibbler.nibble(untyped)
+
+    assert nibbled([1, 2], 2) == [2, 4]
+    assert "COMPARE_OP" not in opnames(nibbled)
+
+
+def test_mixed_types() -> None:
+    # int + float can raise, it isn't hoisted out of loops that don't run
+    nibbled = nibbler.nibble(shifted)
+
+    assert nibbled([], 1.0, 10 ** 400) == []
+    assert nibbled([1], 1.0, 1) == [2.0]
@@ -0,0 +1,79 @@
+from dis import get_instructions
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler.extension import unroll_loops
+
+FIELDS: Constant[tuple] = ("id", "name", "email")
+MANY: Constant[tuple] = tuple(range(unroll_loops.MAX_ITERATIONS + 1))
+
+nibbler = Nibbler(globals(), unroll_loops=True)
+
+
+def serialize(record):
+    parts = []
+    for field in FIELDS:
+        parts.append(f"{field}={record[field]}")
+    return ",".join(parts)
+
+
+def powers(base):
+    total = 0
+    for exponent in range(1, 5):
+        if exponent == 2:
+            continue
+        total += base ** exponent
+    else:
+        total = -total
+    return total
+
+
+def find(value):
+    for index in range(3):
+        for field in FIELDS:
+            if field == value:
+                break
+        else:
+            continue
+        return index, field
+    return None
+
+
+def total():
+    result = 0
+    for number in MANY:
+        result += number
+    return result
+
+
+def opnames(function):
+    return [instruction.opname for instruction in get_instructions(function)]
+
+
+def test_unroll_loops() -> None:
+    record = {"id": 1, "name": "nibbler", "email": "nibbler@example.com"}
+    for function, args in (
+        (serialize, (record,)),
+        (powers, (3,)),
+        (find, ("name",)),
+        (find, ("phone",)),
+    ):
+        nibbled = nibbler.nibble(function)
+        assert nibbled(*args) == function(*args)
+        assert "FOR_ITER" not in opnames(nibbled)
+
+    # The loop variable is loaded as a constant
+    assert not any(
+        instruction.opname == "LOAD_FAST" and instruction.argval == "field"
+        for instruction in get_instructions(nibbler.nibble(serialize))
+    )
+    assert set(FIELDS) <= set(nibbler.nibble(serialize).__code__.co_consts)
+
+
+def test_budget() -> None:
+    nibbled = nibbler.nibble(total)
+
+    assert nibbled() == total()
+    assert "FOR_ITER" in opnames(nibbled)
+    # Unrolling is opt-in
+    assert "FOR_ITER" in opnames(Nibbler(globals()).nibble(serialize))
@@ -0,0 +1,46 @@
+import pytest
+
+from nibbler import Constant
+from nibbler import Nibbler
+from nibbler import pipeline
+from nibbler import util
+from nibbler.constants import MISSING_OPCODE
+from nibbler.constants import opcode
+from nibbler.util import replace_code
+from nibbler.util import with_consts
+
+DEBUG: Constant[bool] = False
+
+nibbler = Nibbler(globals())
+
+
+def foo(value):
+    if DEBUG:
+        return 0
+    return value
+
+
+def test_replace_code() -> None:
+    code = replace_code(foo.__code__, co_name="bar")
+
+    assert code.co_name == "bar"
+    assert code.co_code == foo.__code__.co_code
+    assert opcode("NOT_AN_INSTRUCTION") == MISSING_OPCODE
+
+
+def test_replace_code_unsupported(monkeypatch) -> None:
+    monkeypatch.setattr(util, "SUPPORTED", False)
+
+    # Line tables (and bytecode) of later versions aren't understood
+    with pytest.raises(ValueError):
+        replace_code(foo.__code__, co_lnotab=b"")
+    assert with_consts(foo.__code__, [None]).co_consts == (None,)
+
+
+def test_unsupported(monkeypatch) -> None:
+    monkeypatch.setattr(pipeline, "SUPPORTED", False)
+
+    with pytest.warns(RuntimeWarning):
+        assert nibbler.nibble(foo) is foo
+    with pytest.warns(RuntimeWarning):
+        assert nibbler.nibble_all([foo])[0].__code__ is foo.__code__